@@ -0,0 +1,106 @@
+"""
+Нагрузочный тест очереди доставки с заглушкой вместо Bot.
+
+Планирует N напоминаний на одну и ту же минуту (как 09:00), пропускает их через планировщик
+и DeliveryQueue и измеряет устойчивую скорость отправки и p99 опоздания относительно времени напоминания.
+
+Пример запуска:
+    python benchmarks/delivery_benchmark.py --reminders 5000 --chats 2000 --rate 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+
+from delivery import DeliveryQueue  # noqa: E402
+from scheduler import ReminderScheduler  # noqa: E402
+
+
+class StubBot:
+    """
+    Заглушка Bot: имитирует задержку API и изредка отвечает 429.
+    """
+
+    def __init__(self, latency, error_rate):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(self.latency)
+        if random.random() < self.error_rate:
+            raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text=text), "Too Many Requests", 1)
+        self.sent.append((chat_id, time.time()))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run(args):
+    bot = StubBot(args.latency, args.error_rate)
+    marked = []
+
+    async def mark_sent(reminder_ids):
+        marked.extend(reminder_ids)
+
+    delivery = DeliveryQueue(bot, mark_sent, workers=args.workers, rate=args.rate,
+                             chat_interval=args.chat_interval)
+    delivery.start()
+
+    due_times = {}
+
+    async def send(chat_id, text, reminder_id):
+        await delivery.submit(chat_id, text, reminder_id)
+
+    scheduler = ReminderScheduler(send)
+    scheduler.start()
+
+    due = time.time() + 1.0
+    for reminder_id in range(args.reminders):
+        chat_id = reminder_id % args.chats
+        due_times[reminder_id] = due
+        scheduler.schedule(reminder_id, due, chat_id, f"Напоминание {reminder_id}", reminder_id)
+
+    while len(bot.sent) < args.reminders:
+        await asyncio.sleep(0.05)
+    finished = time.time()
+    await delivery.stop()
+
+    lateness = [sent_at - due for _, sent_at in bot.sent]
+    result = {
+        'reminders': args.reminders,
+        'chats': args.chats,
+        'messages_per_second': round(args.reminders / (finished - due), 1),
+        'lateness_p50': round(percentile(lateness, 0.50), 3),
+        'lateness_p99': round(percentile(lateness, 0.99), 3),
+        'marked_sent': len(marked),
+    }
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reminders', type=int, default=3000)
+    parser.add_argument('--chats', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=30, help='Глобальный лимит сообщений в секунду')
+    parser.add_argument('--chat-interval', type=float, default=1.0)
+    parser.add_argument('--latency', type=float, default=0.05, help='Задержка ответа заглушки API, с')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 429')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
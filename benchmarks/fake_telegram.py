@@ -0,0 +1,159 @@
+"""
+Локальная заглушка Telegram Bot API для нагрузочных тестов.
+
+Отвечает на запросы бота (getMe, getUpdates, sendMessage, editMessageText и т. п.), запоминает
+каждый вызов со временем получения и умеет добавлять задержку ответа и ответы 429. Обновления
+для режима polling выдаются из очереди updates; для режима webhook их нужно отправлять боту
+напрямую (см. make_message_update).
+
+Бот подключается к заглушке через переменную окружения TELEGRAM_API_URL.
+"""
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'AlarmBot', 'username': 'alarm_bot'}
+
+
+def make_message_update(update_id, chat_id, text):
+    """
+    Возвращает JSON обновления с текстовым сообщением от пользователя chat_id.
+    """
+    user = {'id': chat_id, 'is_bot': False, 'first_name': f'user{chat_id}'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': user,
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+            if text.startswith('/') else [],
+        },
+    }
+
+
+def make_callback_update(update_id, chat_id, data, message_id=1):
+    """
+    Возвращает JSON обновления с нажатием инлайн-кнопки с callback_data=data.
+    """
+    user = {'id': chat_id, 'is_bot': False, 'first_name': f'user{chat_id}'}
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': user,
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': '...',
+            },
+        },
+    }
+
+
+class FakeTelegramAPI:
+    """
+    Заглушка Bot API на aiohttp.
+
+    calls — список (метод, chat_id, параметры, время получения) в порядке поступления.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, retry_after=1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.updates = asyncio.Queue()
+        self.calls = []
+        self._message_id = 0
+        self._runner = None
+        self._waiters = []
+
+    def app(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route('*', '/bot{token}/{method}', self._handle)
+        return app
+
+    async def start(self, host='127.0.0.1', port=8081):
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def count(self, method):
+        return sum(1 for call in self.calls if call[0] == method)
+
+    async def wait_for(self, predicate, timeout):
+        """
+        Ждёт, пока predicate() не станет истинным, не дольше timeout секунд.
+        """
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                raise TimeoutError
+            await asyncio.sleep(0.01)
+
+    async def _handle(self, request):
+        method = request.match_info['method']
+        params = dict(await request.post())
+        received_at = time.time()
+        chat_id = params.get('chat_id')
+        self.calls.append((method, int(chat_id) if chat_id else None, params, received_at))
+
+        if method == 'getUpdates':
+            return web.json_response({'ok': True, 'result': await self._get_updates(params)})
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method.startswith('send') and self.error_rate and random.random() < self.error_rate:
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after},
+            }, status=429)
+        return web.json_response({'ok': True, 'result': self._result(method, params)})
+
+    async def _get_updates(self, params):
+        timeout = float(params.get('timeout') or 0)
+        limit = int(params.get('limit') or 100)
+        try:
+            first = await asyncio.wait_for(self.updates.get(), timeout=timeout or 0.01)
+        except asyncio.TimeoutError:
+            return []
+        updates = [first]
+        while len(updates) < limit and not self.updates.empty():
+            updates.append(self.updates.get_nowait())
+        return updates
+
+    def _message(self, params):
+        self._message_id += 1
+        message = {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id') or 0), 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if 'text' in params:
+            message['text'] = params['text']
+        if 'reply_markup' in params:
+            message['reply_markup'] = json.loads(params['reply_markup'])
+        return message
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return BOT_USER
+        if method.startswith('send') or method in ('editMessageText', 'editMessageReplyMarkup'):
+            return self._message(params)
+        return True
@@ -0,0 +1,91 @@
+"""
+Микробенчмарк клавиатур мастера /set: построение InlineKeyboardBuilder на каждый колбэк
+против закэшированных разметок из keyboards.py.
+
+Пример запуска:
+    python benchmarks/keyboard_benchmark.py --number 2000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.utils.keyboard import InlineKeyboardBuilder  # noqa: E402
+
+from keyboards import hour_markup, minute_markup, months_ru, week_markup  # noqa: E402
+
+
+def legacy_week_markup(current_date):
+    """
+    Прежняя реализация show_date_picker/update_date_picker.
+    """
+    builder = InlineKeyboardBuilder()
+    days_short = {
+        0: "Пн", 1: "Вт", 2: "Ср", 3: "Чт", 4: "Пт", 5: "Сб", 6: "Вс"
+    }
+    start_of_week = current_date - timedelta(days=current_date.weekday())
+    builder.button(text="◀️", callback_data="scroll_back")
+    builder.adjust(1)
+    for day in range(7):
+        day_date = start_of_week + timedelta(days=day)
+        if day_date < datetime.now().date():
+            continue
+        builder.button(text=f"{day_date.day} {months_ru[day_date.month]} {days_short[day_date.weekday()]}",
+                       callback_data=f"date_{day_date.strftime('%Y-%m-%d')}")
+    builder.adjust(1)
+    builder.button(text="▶️", callback_data="scroll_forward")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def legacy_hour_markup():
+    builder = InlineKeyboardBuilder()
+    builder.button(text="◀️", callback_data="back_to_date")
+    builder.adjust(1)
+    for hour in range(0, 24):
+        builder.button(text=f"{hour:02}", callback_data=f"hour_{hour:02}")
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+def legacy_minute_markup():
+    builder = InlineKeyboardBuilder()
+    builder.button(text="◀️", callback_data="back_to_hour")
+    builder.adjust(1)
+    for minute in range(0, 60, 5):
+        builder.button(text=f"{minute:02}", callback_data=f"minute_{minute:02}")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def measure(func, number):
+    """
+    Возвращает среднее время одного вызова в микросекундах.
+    """
+    return round(min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    today = date.today()
+    results = {}
+    for name, legacy, cached in (
+        ('week', lambda: legacy_week_markup(today), lambda: week_markup(today)),
+        ('hour', legacy_hour_markup, lambda: hour_markup(today)),
+        ('minute', legacy_minute_markup, lambda: minute_markup(today, 9)),
+    ):
+        legacy_us = measure(legacy, args.number)
+        cached_us = measure(cached, args.number)
+        results[name] = {'legacy_us': legacy_us, 'cached_us': cached_us, 'saved_us': round(legacy_us - cached_us, 2)}
+    print(json.dumps(results, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
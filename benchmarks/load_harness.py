@@ -0,0 +1,419 @@
+"""
+Офлайн-нагрузочный стенд для reminder_bot.py: заглушка сессии Bot API, ускоренные часы и сценарии.
+
+Бот работает в этом же процессе, но вместо Telegram его запросы принимает RecordingSession: она записывает
+каждый вызов с модельным временем, может добавлять задержку ответа и отвечать 429 (retry_after). Модельное
+время идёт в --speed раз быстрее реального: подменяются time.time и time.monotonic, а event loop спит в --speed
+раз меньше, поэтому сутки напоминаний проигрываются за минуты. Задержки, опоздания и интервалы в параметрах
+и результатах — в модельных секундах; задержка обработчиков и лаг event loop — в реальных.
+
+Сценарии:
+- delivery — база заполняется --chats × --reminders напоминаниями, распределёнными на --span секунд
+  (все на одну минуту с --pattern burst; с --pattern peaks большая часть приходится на 09:00 и 18:00);
+  измеряются скорость доставки, опоздание и число вызовов sendMessage (с --coalesce-window видно,
+  сколько сообщений сэкономило объединение напоминаний одного чата);
+- wizard — --chats чатов одновременно проходят мастер /set (дата, час, минуты, текст), после чего
+  созданные напоминания доставляются; измеряются задержка шагов мастера и опоздание доставки.
+
+Во всех сценариях записываются пиковый RSS процесса и лаг event loop. Результат — одна строка JSON
+на сценарий в stdout; с --output она же дописывается в файл (JSON Lines) вместе с версией кода
+для сравнения между версиями.
+
+Пример запуска:
+    python benchmarks/load_harness.py --scenario delivery --chats 1000 --reminders 20 --span 86400 --speed 1000
+    python benchmarks/load_harness.py --scenario all --output results.jsonl
+    python benchmarks/load_harness.py --scenario delivery --pattern peaks --coalesce-window 0
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import selectors
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+from aiogram.methods import EditMessageText, SendMessage  # noqa: E402
+from aiogram.types import Chat, Message, Update  # noqa: E402
+
+from fake_telegram import make_callback_update, make_message_update  # noqa: E402
+
+SCENARIOS = ('delivery', 'wizard')
+FIRST_CHAT_ID = 100000
+REMINDER_PREFIX = "Напоминание: "
+COALESCED_PREFIX = "Напоминания:\n"
+
+# Доли напоминаний на 09:00 и на 18:00 в распределении peaks; остальные распределены по --span равномерно
+PEAKS = ((9, 0.4), (18, 0.3))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summary(values, digits=4):
+    """
+    Возвращает p50, p95, p99 и максимум списка значений.
+    """
+    return {
+        'p50': round(percentile(values, 0.50), digits),
+        'p95': round(percentile(values, 0.95), digits),
+        'p99': round(percentile(values, 0.99), digits),
+        'max': round(max(values, default=0.0), digits),
+    }
+
+
+class AcceleratedClock:
+    """
+    Модельное время, идущее в speed раз быстрее реального, начиная с момента создания.
+    """
+
+    def __init__(self, speed):
+        self.speed = speed
+        self._real_monotonic = time.monotonic
+        self._time0 = time.time()
+        self._monotonic0 = time.monotonic()
+
+    def real_elapsed(self):
+        return self._real_monotonic() - self._monotonic0
+
+    def time(self):
+        return self._time0 + self.real_elapsed() * self.speed
+
+    def monotonic(self):
+        return self._monotonic0 + self.real_elapsed() * self.speed
+
+    def install(self):
+        """
+        Подменяет time.time и time.monotonic модельными. Вызывается до импорта модулей бота, чтобы
+        модельными стали и значения time_func по умолчанию (планировщик, ведро токенов, ExpiringDict).
+        """
+        time.time = self.time
+        time.monotonic = self.monotonic
+
+
+class ScaledSelector(selectors.DefaultSelector):
+    """
+    Селектор, который ждёт в speed раз меньше запрошенного: таймауты event loop считаются в модельном
+    времени (loop.time() — это подменённый time.monotonic), а ждать нужно реальное.
+    """
+
+    def __init__(self, speed):
+        super().__init__()
+        self._speed = speed
+
+    def select(self, timeout=None):
+        if timeout is not None and timeout > 0:
+            timeout /= self._speed
+        return super().select(timeout)
+
+
+class RecordingSession(BaseSession):
+    """
+    Заглушка сессии Bot API. calls — список (метод, chat_id, текст, модельное время) успешных вызовов.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, retry_after=1):
+        super().__init__()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls = []
+        self.rejected = 0
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, SendMessage) and self.error_rate and random.random() < self.error_rate:
+            self.rejected += 1
+            raise TelegramRetryAfter(method, "Too Many Requests", self.retry_after)
+        chat_id = getattr(method, 'chat_id', None)
+        text = getattr(method, 'text', None)
+        self.calls.append((type(method).__name__, chat_id, text, time.time()))
+        if isinstance(method, (SendMessage, EditMessageText)):
+            self._message_id += 1
+            return Message(message_id=self._message_id, date=datetime.now(), chat=Chat(id=chat_id, type='private'),
+                           text=text)
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+    async def close(self):
+        pass
+
+    def reminders(self):
+        """
+        Возвращает (текст напоминания, модельное время отправки) для доставленных напоминаний,
+        в том числе объединённых в одно сообщение.
+        """
+        reminders = []
+        for text, sent_at in self.reminder_messages():
+            if text.startswith(COALESCED_PREFIX):
+                reminders.extend((line.removeprefix("• "), sent_at) for line in text.splitlines()[1:])
+            else:
+                reminders.append((text[len(REMINDER_PREFIX):], sent_at))
+        return reminders
+
+    def reminder_messages(self):
+        """
+        Возвращает (текст, модельное время отправки) сообщений с напоминаниями.
+        """
+        return [(text, sent_at) for method, _, text, sent_at in self.calls
+                if method == 'SendMessage' and text and text.startswith((REMINDER_PREFIX, COALESCED_PREFIX))]
+
+
+async def monitor_loop_lag(clock, samples, interval=0.05):
+    """
+    Каждые interval реальных секунд засыпает и записывает, на сколько позже запланированного проснулся.
+    """
+    while True:
+        started = clock.real_elapsed()
+        await asyncio.sleep(interval * clock.speed)
+        samples.append(max(0.0, clock.real_elapsed() - started - interval))
+
+
+async def wait_delivered(clock, session, expected, deadline):
+    """
+    Ждёт доставки expected напоминаний, но не дольше модельного момента deadline.
+    """
+    while len(session.reminders()) < expected and time.time() < deadline:
+        await asyncio.sleep(0.05 * clock.speed)
+
+
+def delivery_stats(session, due_times):
+    delivered = session.reminders()
+    lateness = [sent_at - due_times[text] for text, sent_at in delivered if text in due_times]
+    messages = len(session.reminder_messages())
+    result = {
+        'expected': len(due_times),
+        'delivered': len({text for text, _ in delivered}),
+        'duplicates': len(delivered) - len({text for text, _ in delivered}),
+        'send_message_calls': messages,
+        'messages_saved': len(delivered) - messages,
+        'rejected_429': session.rejected,
+        'lateness_seconds': summary(lateness, digits=3),
+    }
+    if delivered and due_times:
+        started = min(due_times.values())
+        finished = max(sent_at for _, sent_at in delivered)
+        result['throughput_per_second'] = round(len(delivered) / max(finished - started, 1e-9), 2)
+    return result
+
+
+def peak_time(start, span, rng):
+    """
+    Время напоминания в распределении peaks: ближайшие после start 09:00 или 18:00 (с долями из PEAKS)
+    либо случайная минута в пределах span секунд.
+    """
+    choice = rng.random()
+    for hour, share in PEAKS:
+        if choice < share:
+            peak = start.replace(hour=hour, minute=0, second=0, microsecond=0)
+            return peak if peak > start else peak + timedelta(days=1)
+        choice -= share
+    return start.replace(second=0, microsecond=0) + timedelta(minutes=rng.randrange(1, max(2, int(span // 60))))
+
+
+async def seed(db_path, args):
+    """
+    Заполняет базу напоминаниями и возвращает {текст: время напоминания в секундах UTC}.
+    """
+    from storage import ReminderStore
+
+    store = ReminderStore(db_path)
+    await store.open()
+    start = datetime.fromtimestamp(time.time()).astimezone() + timedelta(seconds=args.lead)
+    total = args.chats * args.reminders
+    due_times = {}
+
+    async def add(chat_index):
+        rows = []
+        rng = random.Random(chat_index)
+        for number in range(args.reminders):
+            if args.pattern == 'peaks':
+                reminder_time = peak_time(start, args.span, rng)
+            else:
+                offset = 0 if args.pattern == 'burst' else args.span * (number * args.chats + chat_index) / total
+                reminder_time = start + timedelta(seconds=offset)
+            text = f"load {chat_index}-{number}"
+            due_times[text] = int(reminder_time.timestamp())
+            rows.append((reminder_time, text, None))
+        await store.add_reminders(FIRST_CHAT_ID + chat_index, rows, 0)
+
+    await asyncio.gather(*(add(chat_index) for chat_index in range(args.chats)))
+    await store.close()
+    return due_times
+
+
+async def scenario_delivery(args, clock, bot_module, session):
+    due_times = await seed(os.environ['DB_PATH'], args)
+    await bot_module.start_dispatch()
+    await wait_delivered(clock, session, len(due_times), max(due_times.values(), default=0) + args.timeout)
+    return delivery_stats(session, due_times)
+
+
+async def scenario_wizard(args, clock, bot_module, session):
+    from keyboards import pack_selection
+
+    await bot_module.start_dispatch()
+    bot, dispatcher = bot_module.bot, bot_module.dp
+    steps = {'set': [], 'date': [], 'hour': [], 'minute': [], 'text': []}
+    due_times = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    update_ids = iter(range(1, 10 ** 9))
+
+    async def feed(step, update):
+        started = clock.real_elapsed()
+        await dispatcher.feed_update(bot, Update.model_validate(update, context={'bot': bot}))
+        steps[step].append(clock.real_elapsed() - started)
+
+    async def walk(chat_index):
+        chat_id = FIRST_CHAT_ID + chat_index
+        zone = await bot_module.chat_timezone(chat_id)
+        # Мастер предлагает минуты с шагом 5, поэтому время напоминания округляется вверх до 5 минут
+        target = datetime.fromtimestamp(time.time() + args.lead, zone).replace(second=0, microsecond=0)
+        target += timedelta(minutes=5 - target.minute % 5)
+        day = target.date()
+        text = f"wizard {chat_index}"
+        async with semaphore:
+            await feed('set', make_message_update(next(update_ids), chat_id, '/set'))
+            await feed('date', make_callback_update(next(update_ids), chat_id, f"date_{pack_selection(day)}"))
+            await feed('hour', make_callback_update(next(update_ids), chat_id,
+                                                    f"hour_{pack_selection(day, target.hour)}"))
+            await feed('minute', make_callback_update(next(update_ids), chat_id,
+                                                      f"minute_{pack_selection(day, target.hour, target.minute)}"))
+            update = make_message_update(next(update_ids), chat_id, text)
+            await feed('text', update)
+        due_times[text] = int(target.timestamp())
+
+    await asyncio.gather(*(walk(chat_index) for chat_index in range(args.chats)))
+    result = {'handler_latency_seconds': {step: summary(values) for step, values in steps.items()}}
+    await wait_delivered(clock, session, len(due_times), max(due_times.values(), default=0) + args.timeout)
+    result.update(delivery_stats(session, due_times))
+    return result
+
+
+async def run_scenario(args, clock):
+    import reminder_bot
+
+    session = RecordingSession(args.latency, args.error_rate, args.retry_after)
+    reminder_bot.bot.session = session
+    lag = []
+    monitor = asyncio.create_task(monitor_loop_lag(clock, lag))
+    started = clock.real_elapsed()
+    try:
+        scenario = scenario_delivery if args.scenario == 'delivery' else scenario_wizard
+        result = await scenario(args, clock, reminder_bot, session)
+    finally:
+        monitor.cancel()
+        await reminder_bot.store.close()
+
+    result = {
+        'scenario': args.scenario,
+        'chats': args.chats,
+        'reminders_per_chat': args.reminders if args.scenario == 'delivery' else 1,
+        'speed': args.speed,
+        'latency': args.latency,
+        'error_rate': args.error_rate,
+        'coalesce_window': reminder_bot.COALESCE_WINDOW,
+        **result,
+        'real_seconds': round(clock.real_elapsed() - started, 2),
+        'loop_lag_seconds': summary(lag),
+        'rss_peak_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None,
+    }
+    return result
+
+
+def code_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_in_process(args):
+    """
+    Выполняет один сценарий в этом процессе: бот импортируется после подмены часов в пустом каталоге.
+    """
+    workdir = tempfile.mkdtemp(prefix='alarmbot-load-')
+    os.chdir(workdir)
+    os.environ.update(DB_PATH=os.path.join(workdir, 'reminders.db'), METRICS_PORT='0', LOG_LEVEL=args.log_level,
+                      TELEGRAM_BOT_TOKEN='123456:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA')
+    if args.rate:
+        os.environ['DELIVERY_RATE'] = str(args.rate)
+    if args.coalesce_window is not None:
+        os.environ['COALESCE_WINDOW'] = str(args.coalesce_window)
+
+    clock = AcceleratedClock(args.speed)
+    clock.install()
+    with asyncio.Runner(loop_factory=lambda: asyncio.SelectorEventLoop(ScaledSelector(args.speed))) as runner:
+        return runner.run(run_scenario(args, clock))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=(*SCENARIOS, 'all'), default='all')
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--reminders', type=int, default=10, help='Напоминаний на чат (сценарий delivery)')
+    parser.add_argument('--pattern', choices=('uniform', 'burst', 'peaks'), default='uniform',
+                        help='uniform — равномерно на --span секунд, burst — все в одну минуту, '
+                             'peaks — в основном на 09:00 и 18:00')
+    parser.add_argument('--span', type=float, default=86400, help='Интервал, на который распределены напоминания')
+    parser.add_argument('--lead', type=float, default=600, help='Через сколько секунд наступает первое напоминание')
+    parser.add_argument('--speed', type=float, default=600, help='Во сколько раз модельное время быстрее реального')
+    parser.add_argument('--latency', type=float, default=0.05, help='Задержка ответа заглушки Bot API')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля отправок, получающих ответ 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after в ответах 429')
+    parser.add_argument('--rate', type=float, help='DELIVERY_RATE бота (по умолчанию — из окружения или 30)')
+    parser.add_argument('--coalesce-window', type=float,
+                        help='COALESCE_WINDOW бота (по умолчанию — из окружения или 2; 0 — без объединения)')
+    parser.add_argument('--concurrency', type=int, default=50, help='Чатов, одновременно проходящих мастер /set')
+    parser.add_argument('--timeout', type=float, default=3600,
+                        help='Сколько ждать доставки после времени последнего напоминания')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--output', help='Файл JSON Lines, в который дописываются результаты')
+    args = parser.parse_args()
+
+    if args.scenario == 'all':
+        # Каждый сценарий — в отдельном процессе: модуль бота хранит состояние в глобальных переменных
+        results = []
+        for scenario in SCENARIOS:
+            argv = [arg for arg in sys.argv[1:] if not arg.startswith('--output') and arg != args.output]
+            command = [sys.executable, os.path.abspath(__file__), *argv, '--scenario', scenario]
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    else:
+        results = [run_in_process(args)]
+
+    version = code_version()
+    for result in results:
+        result.setdefault('version', version)
+        print(json.dumps(result, ensure_ascii=False))
+        if args.output:
+            result['timestamp'] = datetime.now().astimezone().isoformat(timespec='seconds')
+            with open(args.output, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
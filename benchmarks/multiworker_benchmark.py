@@ -0,0 +1,158 @@
+"""
+Проверка работы нескольких процессов бота с одной базой (SQLite или PostgreSQL) и заглушкой вместо Bot.
+
+Родительский процесс создаёт базу, заполняет её напоминаниями на ближайшие секунды и запускает
+несколько рабочих процессов (каждый со своим WORKER_ID). Напоминания добавляются так же, как при
+обновлении от пользователя: от имени процесса worker-0, который принимает обновления, поэтому чаты
+других процессов записываются без аренды и их должен забрать процесс-владелец. Каждый процесс записывает отправленные
+сообщения в свой файл; по итогам проверяется, что ни одно напоминание не отправлено дважды.
+С флагом --kill первый процесс принудительно завершается, и его напоминания должны забрать
+остальные процессы после истечения аренды.
+
+Пример запуска:
+    python benchmarks/multiworker_benchmark.py --workers 4 --reminders 2000 --kill
+    python benchmarks/multiworker_benchmark.py --workers 4 --database-url postgresql://localhost/alarmbot_test
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class StubBot:
+    """
+    Заглушка Bot: записывает каждое отправленное сообщение в файл.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'a', encoding='utf-8')
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self._file.write(json.dumps({'chat_id': chat_id, 'text': text, 'sent_at': time.time()}) + '\n')
+        self._file.flush()
+
+
+async def run_worker(args):
+    import logging
+
+    import reminder_bot
+
+    logging.getLogger().setLevel(logging.WARNING)
+    reminder_bot.bot = StubBot(args.out)
+    await reminder_bot.start_dispatch()
+    await asyncio.sleep(args.duration)
+
+
+async def seed(args, db_path):
+    lease = {'worker_id': 'worker-0', 'worker_index': 0, 'worker_count': args.workers}
+    if args.database_url:
+        from pg_storage import PostgresReminderStore
+
+        store = PostgresReminderStore(args.database_url, **lease)
+    else:
+        from storage import ReminderStore
+
+        store = ReminderStore(db_path, **lease)
+    await store.open()
+    start = datetime.now(timezone.utc) + timedelta(seconds=args.lead)
+
+    # Тот же вызов, что в create_reminder; SCHEDULE_POLL_INTERVAL рабочих процессов — 1 с
+    claim_until = int(time.time()) + 1
+    await asyncio.gather(*(
+        store.add_reminder(i % args.chats, start + timedelta(seconds=args.spread * i / args.reminders),
+                           f"Напоминание {i}", claim_until=claim_until)
+        for i in range(args.reminders)))
+    await store.close()
+
+
+def _reminder_texts(text):
+    # Напоминания одного чата, наступившие вместе, приходят одним сообщением «Напоминания:» со списком
+    if text.startswith('Напоминания:\n'):
+        return [line[2:] for line in text.splitlines()[1:]]
+    return [text]
+
+
+def run_parent(args):
+    workdir = tempfile.mkdtemp(prefix='alarmbot-multiworker-')
+    db_path = os.path.join(workdir, 'reminders.db')
+    asyncio.run(seed(args, db_path))
+
+    processes = []
+    outputs = []
+    for index in range(args.workers):
+        out = os.path.join(workdir, f'sent-{index}.jsonl')
+        outputs.append(out)
+        env = dict(os.environ, DB_PATH=db_path, DATABASE_URL=args.database_url or '', WORKER_ID=f'worker-{index}',
+                   WORKER_INDEX=str(index), WORKER_COUNT=str(args.workers),
+                   TELEGRAM_BOT_TOKEN='123456:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA',
+                   SCHEDULE_HORIZON='60', SCHEDULE_POLL_INTERVAL='1', LEASE_GRACE=str(args.lease_grace),
+                   DELIVERY_RATE='100000', DELIVERY_CHAT_INTERVAL='0')
+        processes.append(subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--worker', '--out', out,
+             '--duration', str(args.lead + args.spread + args.lease_grace + 5)],
+            cwd=workdir, env=env))
+
+    if args.kill:
+        # Завершаем процесс, когда он уже арендовал напоминания, но ещё не начал их отправлять
+        time.sleep(args.lead - 1)
+        processes[0].kill()
+    for process in processes:
+        process.wait()
+
+    sent = Counter()
+    per_worker = []
+    for out in outputs:
+        count = 0
+        if os.path.exists(out):
+            with open(out, encoding='utf-8') as f:
+                for line in f:
+                    for text in _reminder_texts(json.loads(line)['text']):
+                        sent[text] += 1
+                        count += 1
+        per_worker.append(count)
+
+    result = {
+        'workers': args.workers,
+        'reminders': args.reminders,
+        'delivered': len(sent),
+        'duplicates': sum(count - 1 for count in sent.values() if count > 1),
+        'missing': args.reminders - len(sent),
+        'per_worker': per_worker,
+        'killed_worker': 0 if args.kill else None,
+    }
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--reminders', type=int, default=1000)
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--spread', type=float, default=5, help='Интервал, на который распределены напоминания, с')
+    parser.add_argument('--lead', type=float, default=15,
+                        help='Через сколько секунд после заполнения базы наступает первое напоминание')
+    parser.add_argument('--lease-grace', type=int, default=3)
+    parser.add_argument('--database-url',
+                        help='Пустая база PostgreSQL вместо SQLite, например postgresql://localhost/alarmbot')
+    parser.add_argument('--kill', action='store_true', help='Принудительно завершить первый процесс')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--out', help=argparse.SUPPRESS)
+    parser.add_argument('--duration', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        asyncio.run(run_worker(args))
+    else:
+        run_parent(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Бенчмарк поиска /find и подсказок мастера /set по полнотекстовому индексу reminders_fts
+против прежнего способа — LIKE '%слово%' по напоминаниям чата.
+
+База заполняется через ReminderStore (индекс обновляют триггеры), затем для случайных чатов
+и слов измеряется время search_reminders, complete_messages и запроса с LIKE.
+
+Пример запуска:
+    python benchmarks/search_benchmark.py --rows 1000000 --chats 10000 --queries 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import ReminderStore  # noqa: E402
+
+WORDS = ('позвонить', 'маме', 'врачу', 'купить', 'молоко', 'хлеб', 'оплатить', 'интернет', 'квартиру', 'забрать',
+         'посылку', 'встреча', 'командой', 'отчёт', 'записаться', 'стоматологу', 'полить', 'цветы', 'тренировка',
+         'бассейн', 'день', 'рождения', 'подарок', 'таблетки', 'выпить', 'отправить', 'документы', 'проверить', 'почту')
+
+# Число чатов, напоминания которых добавляются одновременно
+FILL_CHATS = 100
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+        'p99_ms': round(samples[int(len(samples) * 0.99)] * 1000, 3),
+    }
+
+
+async def fill(store, rows, chats, rng):
+    """
+    Добавляет rows напоминаний из 2–5 случайных слов, равномерно по chats чатам.
+    """
+    now = datetime.now(timezone.utc)
+    per_chat = rows // chats
+    started = time.perf_counter()
+    for first in range(1, chats + 1, FILL_CHATS):
+        # Записи нескольких чатов ставятся в очередь одновременно и фиксируются одной транзакцией
+        await asyncio.gather(*(
+            store.add_reminders(chat_id, [
+                (now + timedelta(minutes=rng.randrange(1, 100000)), ' '.join(rng.sample(WORDS, rng.randint(2, 5))),
+                 None)
+                for _ in range(per_chat)
+            ], 0)
+            for chat_id in range(first, min(first + FILL_CHATS, chats + 1))
+        ))
+    return time.perf_counter() - started
+
+
+async def measure(func, queries):
+    samples = []
+    for args in queries:
+        started = time.perf_counter()
+        await func(*args)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+async def run(args):
+    rng = random.Random(1)
+    path = os.path.join(tempfile.mkdtemp(), 'search.db')
+    store = ReminderStore(path)
+    await store.open()
+    fill_seconds = await fill(store, args.rows, args.chats, rng)
+
+    queries = [(rng.randint(1, args.chats), rng.choice(WORDS)[:rng.randint(3, 6)]) for _ in range(args.queries)]
+
+    async def like(chat_id, text):
+        # Через тот же пул читающих потоков, что и поиск, чтобы сравнивались только запросы
+        return await store._read('like', lambda conn: conn.execute('''
+        SELECT id, reminder_ts, reminder_message FROM reminders
+        WHERE chat_id = ? AND reminder_message LIKE ?
+        ORDER BY reminder_ts DESC LIMIT 10
+        ''', (chat_id, f'%{text}%')).fetchall())
+
+    results = {
+        'rows': args.rows,
+        'chats': args.chats,
+        'fill_rows_per_second': round(args.rows / fill_seconds),
+        'search': await measure(store.search_reminders, queries),
+        'complete': await measure(store.complete_messages, queries),
+        'like': await measure(like, queries),
+    }
+    await store.close()
+    print(json.dumps(results, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--chats', type=int, default=10000)
+    parser.add_argument('--queries', type=int, default=2000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
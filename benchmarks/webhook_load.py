@@ -0,0 +1,153 @@
+"""
+Генератор нагрузки для сравнения режимов получения обновлений: webhook и polling.
+
+Запускает локальную заглушку Bot API (fake_telegram.py) и бота в отдельном процессе, подключённого
+к ней через TELEGRAM_API_URL. Затем отправляет N синтетических обновлений /start от разных чатов:
+в режиме webhook — POST-запросами на сервер бота, в режиме polling — через очередь getUpdates.
+Задержка обработчика — время от отправки обновления до получения заглушкой ответа sendMessage.
+
+Пример запуска:
+    python benchmarks/webhook_load.py --mode webhook --workers 2 --updates 2000
+    python benchmarks/webhook_load.py --mode polling --updates 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import FakeTelegramAPI, make_message_update  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = 'load-test-secret'
+FIRST_CHAT_ID = 100000
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def launch_bot(args, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT, DB_PATH=os.path.join(workdir, 'reminders.db'),
+               TELEGRAM_BOT_TOKEN='123456:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA',
+               TELEGRAM_API_URL=f'http://127.0.0.1:{args.api_port}', BOT_MODE=args.mode,
+               WEBHOOK_URL=f'http://127.0.0.1:{args.port}', WEBHOOK_SECRET=SECRET, WEBHOOK_HOST='127.0.0.1',
+               WEBHOOK_PORT=str(args.port), WEBHOOK_WORKERS=str(args.workers))
+    log = open(os.path.join(workdir, 'bot.out'), 'w')
+    return subprocess.Popen([sys.executable, '-m', 'reminder_bot'], cwd=workdir, env=env, stdout=log, stderr=log)
+
+
+async def send_webhook_updates(args, updates, sent_at):
+    """
+    Отправляет обновления POST-запросами с ограничением параллельности и возвращает задержки ответа сервера.
+    """
+    url = f'http://127.0.0.1:{args.port}/webhook'
+    headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    ack_latencies = []
+
+    async with aiohttp.ClientSession() as session:
+        async def post(update):
+            async with semaphore:
+                chat_id = update['message']['chat']['id']
+                sent_at[chat_id] = time.time()
+                async with session.post(url, json=update, headers=headers) as response:
+                    await response.read()
+                    ack_latencies.append(time.time() - sent_at[chat_id])
+
+        await asyncio.gather(*(post(update) for update in updates))
+    return ack_latencies
+
+
+async def wait_webhook_ready(args, api):
+    await api.wait_for(lambda: api.count('setWebhook') > 0, timeout=60)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', args.port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run(args):
+    api = FakeTelegramAPI(latency=args.api_latency)
+    await api.start(port=args.api_port)
+    workdir = tempfile.mkdtemp(prefix='alarmbot-webhook-')
+    process = launch_bot(args, workdir)
+    try:
+        if args.mode == 'webhook':
+            await wait_webhook_ready(args, api)
+        else:
+            await api.wait_for(lambda: api.count('getUpdates') > 0, timeout=60)
+
+        updates = [make_message_update(i + 1, FIRST_CHAT_ID + i, '/start') for i in range(args.updates)]
+        sent_at = {}
+        ack_latencies = []
+        started = time.time()
+        if args.mode == 'webhook':
+            ack_latencies = await send_webhook_updates(args, updates, sent_at)
+        else:
+            for update in updates:
+                sent_at[update['message']['chat']['id']] = time.time()
+                api.updates.put_nowait(update)
+
+        def replied():
+            return sum(1 for call in api.calls if call[0] == 'sendMessage' and call[1] in sent_at)
+
+        await api.wait_for(lambda: replied() >= args.updates, timeout=args.timeout)
+
+        replies = {}
+        for method, chat_id, _, received_at in api.calls:
+            if method == 'sendMessage' and chat_id in sent_at and chat_id not in replies:
+                replies[chat_id] = received_at
+        handler_latencies = [replies[chat_id] - sent_at[chat_id] for chat_id in replies]
+        finished = max(replies.values())
+
+        result = {
+            'mode': args.mode,
+            'workers': args.workers if args.mode == 'webhook' else 1,
+            'updates': args.updates,
+            'updates_per_second': round(args.updates / (finished - started), 1),
+            'handler_latency_p50': round(percentile(handler_latencies, 0.50), 4),
+            'handler_latency_p99': round(percentile(handler_latencies, 0.99), 4),
+        }
+        if ack_latencies:
+            result['ack_latency_p50'] = round(percentile(ack_latencies, 0.50), 4)
+            result['ack_latency_p99'] = round(percentile(ack_latencies, 0.99), 4)
+        print(json.dumps(result, ensure_ascii=False))
+    finally:
+        process.terminate()
+        process.wait()
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('webhook', 'polling'), default='webhook')
+    parser.add_argument('--updates', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50, help='Параллельных POST-запросов (webhook)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Процессов бота (webhook): первый принимает обновления, остальные доставляют')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--api-port', type=int, default=8081)
+    parser.add_argument('--api-latency', type=float, default=0.0, help='Задержка ответа заглушки Bot API, с')
+    parser.add_argument('--timeout', type=float, default=120)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from functools import partial
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, \
+    TelegramServerError
+
+from metrics import Counter, Histogram
+
+# Границы корзин опоздания (в секундах): от долей секунды до длительных задержек после простоя
+LATENESS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 3600)
+
+DELIVERY_LATENESS = Histogram('reminder_delivery_lateness_seconds',
+                              'Опоздание доставки напоминания относительно назначенного времени',
+                              buckets=LATENESS_BUCKETS)
+DELIVERY_REJECTED = Counter('reminder_delivery_rejected_total',
+                            'Сообщения, отклонённые Telegram без повтора (бот заблокирован, чат недоступен)')
+
+# Результаты попытки доставки: доставлено, отклонено Telegram (повтор не поможет), не доставлено после повторов
+SENT, REJECTED, FAILED = 'sent', 'rejected', 'failed'
+
+
+class TokenBucket:
+    """
+    Ведро токенов для ограничения глобальной частоты отправки сообщений.
+    """
+
+    def __init__(self, rate, capacity=None, time_func=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._time = time_func
+        self._tokens = self.capacity
+        self._updated = time_func()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Ждёт, пока в ведре появится токен, и забирает его.
+        """
+        async with self._lock:
+            while True:
+                now = self._time()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatCoalescer:
+    """
+    Собирает элементы, поступившие для одного чата в течение window секунд после первого из них,
+    и передаёт их корутине flush(chat_id, items) одной пачкой. Задержка отправки — не больше window.
+    Элемент с ключом, который уже ждёт отправки или отправляется, не добавляется повторно.
+    """
+
+    def __init__(self, flush, window):
+        self._flush = flush
+        self._window = window
+        self._pending = {}  # chat_id -> {ключ: элемент}, ожидающие конца окна
+        self._keys = set()  # Ключи ожидающих и отправляемых элементов
+        self._running = set()  # Ссылки на запущенные flush, чтобы их не собрал GC
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def add(self, chat_id, key, item):
+        if key in self._keys:
+            return
+        items = self._pending.get(chat_id)
+        if items is None:
+            items = self._pending[chat_id] = {}
+            asyncio.get_running_loop().call_later(self._window, self._start_flush, chat_id)
+        items[key] = item
+        self._keys.add(key)
+
+    def _start_flush(self, chat_id):
+        items = self._pending.pop(chat_id)
+        task = asyncio.create_task(self._flush(chat_id, list(items.values())))
+        self._running.add(task)
+        task.add_done_callback(partial(self._on_done, items))
+
+    def _on_done(self, items, task):
+        self._running.discard(task)
+        self._keys.difference_update(items)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Ошибка при отправке напоминаний", exc_info=task.exception())
+
+
+class DeliveryQueue:
+    """
+    Очередь исходящих напоминаний между планировщиком и bot.send_message.
+
+    Ограниченная очередь обслуживается пулом отправителей. Глобальная частота ограничена ведром токенов,
+    сообщения в один чат отправляются не чаще, чем раз в chat_interval секунд, а ответ 429 (retry_after)
+    приостанавливает все отправители на указанное Telegram время. Идентификаторы доставленных напоминаний
+    передаются в корутину on_sent, а недоставленных после всех повторов — в on_failed; и те, и другие пачками.
+    on_failed получает два списка: идентификаторы напоминаний и пары (идентификатор, время) недоставленных
+    отложенных отправок (snoozed), у которых своя отметка в базе.
+    Сообщения, отклонённые Telegram (бот заблокирован, чат недоступен), не попадают ни в один из списков.
+
+    Сообщение в чат, которому ещё рано писать, не занимает отправителя: оно откладывается в очередь этого чата
+    и возвращается в общую очередь таймером, когда интервал истечёт. Поэтому активный чат не задерживает
+    сообщения остальных чатов, а порядок сообщений внутри чата сохраняется.
+    """
+
+    def __init__(self, bot, on_sent=None, on_failed=None, workers=8, maxsize=10000, rate=30, chat_interval=1.0,
+                 max_retries=5, batch_size=100, flush_interval=1.0):
+        self._bot = bot
+        self._on_sent = on_sent
+        self._on_failed = on_failed
+        self._workers_count = workers
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._bucket = TokenBucket(rate)
+        self._chat_interval = chat_interval
+        self._chat_next_at = {}  # chat_id -> время, раньше которого в чат писать нельзя
+        self._deferred = {}  # chat_id -> deque отложенных сообщений, ждущих интервала чата
+        self._deferred_count = 0
+        self._paused_until = 0.0
+        self._max_retries = max_retries
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._sent_ids = []
+        self._failed_ids = []
+        self._failed_snoozes = []
+        self._flush_event = asyncio.Event()
+        self._tasks = []
+
+    def qsize(self):
+        return self._queue.qsize() + self._deferred_count
+
+    async def submit(self, chat_id, text, reminder_id, reply_markup=None, due=None, snoozed=False):
+        """
+        Ставит сообщение в очередь на отправку. Ждёт, если очередь заполнена.
+        reminder_id — идентификатор напоминания или кортеж идентификаторов, если сообщение объединяет несколько
+        напоминаний; due — назначенное время напоминания (секунды UTC) для метрики опоздания доставки;
+        snoozed — повторная отправка отложенного напоминания.
+        """
+        await self._queue.put((chat_id, text, reminder_id, reply_markup, due, snoozed, False))
+
+    def start(self):
+        """
+        Запускает отправителей и фоновую запись отметок об отправке.
+        """
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers_count)]
+            self._tasks.append(asyncio.create_task(self._flusher()))
+        return self._tasks
+
+    async def stop(self):
+        """
+        Дожидается отправки поставленных в очередь сообщений и останавливает отправителей.
+        """
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._flush()
+
+    def _pace_chat(self, item):
+        """
+        Соблюдает минимальный интервал между сообщениями в один чат. Возвращает True, если сообщение можно
+        отправлять сейчас; иначе откладывает его до истечения интервала чата и возвращает False.
+
+        Пока у чата есть отложенные сообщения, новые встают за ними; released — сообщение, которое
+        вернул в очередь таймер, оно первое в очереди чата.
+        """
+        chat_id, released = item[0], item[-1]
+        now = time.monotonic()
+        next_at = self._chat_next_at.get(chat_id, 0.0)
+        pending = self._deferred.get(chat_id)
+        if pending is not None and not released:
+            # Таймер чата уже взведён (или его сообщение уже в очереди) — просто встаём в конец
+            pending.append(item)
+            self._deferred_count += 1
+            return False
+        if next_at > now:
+            if pending is None:
+                pending = self._deferred[chat_id] = deque()
+            pending.appendleft(item)
+            self._deferred_count += 1
+            self._arm_release(chat_id, next_at - now)
+            return False
+        self._chat_next_at[chat_id] = now + self._chat_interval
+        if pending is not None:
+            if pending:
+                self._arm_release(chat_id, self._chat_interval)
+            else:
+                del self._deferred[chat_id]
+        return True
+
+    def _arm_release(self, chat_id, delay):
+        asyncio.get_running_loop().call_later(delay, self._release, chat_id)
+
+    def _release(self, chat_id):
+        """
+        Возвращает первое отложенное сообщение чата в общую очередь.
+        """
+        pending = self._deferred[chat_id]
+        try:
+            self._queue.put_nowait((*pending[0][:-1], True))
+        except asyncio.QueueFull:
+            # Очередь заполнена новыми сообщениями — пробуем чуть позже, сообщение остаётся первым в чате
+            self._arm_release(chat_id, self._chat_interval or 0.1)
+            return
+        pending.popleft()
+        self._deferred_count -= 1
+        # Отложенное сообщение уже учтено в очереди (task_done для него не вызывался), а put_nowait учёл его
+        # повторно, поэтому join() ждёт и отложенные сообщения
+        self._queue.task_done()
+
+    async def _wait_pause(self):
+        """
+        Ждёт окончания паузы, назначенной Telegram через retry_after.
+        """
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def _deliver(self, chat_id, text, reply_markup=None):
+        """
+        Отправляет сообщение с повторами. Возвращает SENT, REJECTED (Telegram отказал, повтор не поможет)
+        или FAILED (повторы исчерпаны).
+        """
+        for attempt in range(self._max_retries + 1):
+            await self._wait_pause()
+            await self._bucket.acquire()
+            try:
+                if reply_markup is None:
+                    await self._bot.send_message(chat_id=chat_id, text=text)
+                else:
+                    await self._bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+                return SENT
+            except TelegramRetryAfter as e:
+                logging.warning("Превышен лимит Telegram, пауза %s с", e.retry_after)
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # Пользователь заблокировал бота или чат недоступен — повтор не поможет
+                logging.warning("Напоминание для пользователя %s не доставлено: %s", chat_id, e)
+                return REJECTED
+            except (TelegramNetworkError, TelegramServerError) as e:
+                delay = min(2 ** attempt, 60)
+                logging.warning("Ошибка отправки для пользователя %s: %s. Повтор через %s с", chat_id, e, delay)
+                await asyncio.sleep(delay)
+        logging.error("Не удалось отправить напоминание пользователю %s после %s повторов", chat_id, self._max_retries)
+        return FAILED
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            if not self._pace_chat(item):
+                # Отложено до интервала чата; task_done вызовет _release, вернув сообщение в очередь
+                continue
+            chat_id, text, reminder_id, reply_markup, due, snoozed, _ = item
+            try:
+                status = await self._deliver(chat_id, text, reply_markup)
+                if status == SENT and due is not None:
+                    DELIVERY_LATENESS.observe(max(0.0, time.time() - due))
+            except Exception:
+                logging.exception("Ошибка при доставке напоминания %s", reminder_id)
+                status = FAILED
+            try:
+                if status == REJECTED:
+                    DELIVERY_REJECTED.inc()
+                    continue
+                ids = self._sent_ids if status == SENT else self._failed_ids
+                if status == FAILED and snoozed:
+                    self._failed_snoozes.append((reminder_id, due))
+                elif isinstance(reminder_id, tuple):
+                    ids.extend(reminder_id)
+                else:
+                    ids.append(reminder_id)
+                if len(self._sent_ids) + len(self._failed_ids) + len(self._failed_snoozes) >= self._batch_size:
+                    self._flush_event.set()
+            finally:
+                self._queue.task_done()
+
+    async def _flush(self):
+        """
+        Передаёт накопленные идентификаторы доставленных и недоставленных напоминаний обработчикам.
+        """
+        sent_ids, self._sent_ids = self._sent_ids, []
+        failed_ids, self._failed_ids = self._failed_ids, []
+        failed_snoozes, self._failed_snoozes = self._failed_snoozes, []
+        try:
+            if sent_ids and self._on_sent is not None:
+                await self._on_sent(sent_ids)
+                sent_ids = []
+            if (failed_ids or failed_snoozes) and self._on_failed is not None:
+                await self._on_failed(failed_ids, failed_snoozes)
+                failed_ids, failed_snoozes = [], []
+        finally:
+            # Необработанные идентификаторы вернутся в буфер для следующей попытки
+            self._sent_ids = sent_ids + self._sent_ids if self._on_sent is not None else []
+            if self._on_failed is not None:
+                self._failed_ids = failed_ids + self._failed_ids
+                self._failed_snoozes = failed_snoozes + self._failed_snoozes
+            else:
+                self._failed_ids, self._failed_snoozes = [], []
+        self._prune_chats()
+
+    def _prune_chats(self):
+        """
+        Удаляет устаревшие записи интервалов по чатам, чтобы словарь не рос бесконечно.
+        """
+        now = time.monotonic()
+        if len(self._chat_next_at) > 1000:
+            self._chat_next_at = {chat_id: next_at for chat_id, next_at in self._chat_next_at.items() if next_at > now}
+
+    async def _flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                await self._flush()
+            except Exception:
+                logging.exception("Ошибка при сохранении отметок об отправке")
@@ -0,0 +1,165 @@
+import string
+from datetime import date, timedelta
+from functools import lru_cache
+
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+# Словарь для перевода месяцев на русский язык
+months_ru = {
+    1: "Янв", 2: "Фев", 3: "Мар", 4: "Апр", 5: "Май", 6: "Июн",
+    7: "Июл", 8: "Авг", 9: "Сен", 10: "Окт", 11: "Ноя", 12: "Дек"
+}
+
+# Словарь для перевода дней недели на русский язык
+days_ru = {
+    0: "Пн", 1: "Вт", 2: "Ср", 3: "Чт", 4: "Пт", 5: "Сб", 6: "Вс"
+}
+
+# Дата, для которой заполнен кэш недельных клавиатур
+_week_cache_day = None
+
+# Алфавит для компактной записи чисел в callback_data (Telegram ограничивает её 64 байтами)
+_ALPHABET = string.digits + string.ascii_lowercase
+
+
+def format_date(value):
+    """
+    Возвращает дату в виде «18 Окт Вс».
+    """
+    return f"{value.day} {months_ru[value.month]} {days_ru[value.weekday()]}"
+
+
+# --- Кодирование выбора в callback_data ---
+#
+# Выбранные дата, час и минуты упаковываются в одно число (дни от начала эры, затем часы и минуты)
+# и записываются в base36. Поэтому обработчикам мастера /set не нужно хранить состояние на сервере.
+
+def _to_base36(number):
+    digits = []
+    while True:
+        number, remainder = divmod(number, 36)
+        digits.append(_ALPHABET[remainder])
+        if not number:
+            return ''.join(reversed(digits))
+
+
+def pack_selection(day, hour=None, minute=None):
+    """
+    Упаковывает дату и, при наличии, час и минуты в короткую строку.
+    """
+    number = day.toordinal()
+    if hour is not None:
+        number = number * 24 + hour
+        if minute is not None:
+            number = number * 60 + minute
+    return _to_base36(number)
+
+
+def unpack_date(token):
+    return date.fromordinal(int(token, 36))
+
+
+def unpack_hour(token):
+    """
+    Возвращает (дата, час) из строки pack_selection(day, hour).
+    """
+    days, hour = divmod(int(token, 36), 24)
+    return date.fromordinal(days), hour
+
+
+def unpack_minute(token):
+    """
+    Возвращает (дата, час, минуты) из строки pack_selection(day, hour, minute).
+    """
+    hours, minute = divmod(int(token, 36), 60)
+    days, hour = divmod(hours, 24)
+    return date.fromordinal(days), hour, minute
+
+
+# --- Клавиатуры ---
+# Разметки кэшируются и общие для всех пользователей — их нельзя изменять после создания.
+
+@lru_cache(maxsize=256)
+def hour_markup(day):
+    """
+    Клавиатура выбора часа для выбранной даты.
+    """
+    token = pack_selection(day)
+    builder = InlineKeyboardBuilder()
+    builder.button(text="◀️", callback_data=f"back_to_date_{token}")
+    builder.adjust(1)
+    for hour in range(0, 24):
+        builder.button(text=f"{hour:02}", callback_data=f"hour_{pack_selection(day, hour)}")
+    builder.adjust(2)  # Отображаем часы в двух столбцах
+    return builder.as_markup()
+
+
+@lru_cache(maxsize=1024)
+def minute_markup(day, hour):
+    """
+    Клавиатура выбора минут для выбранных даты и часа.
+    """
+    builder = InlineKeyboardBuilder()
+    builder.button(text="◀️", callback_data=f"back_to_hour_{pack_selection(day)}")
+    builder.adjust(1)
+    for minute in range(0, 60, 5):
+        builder.button(text=f"{minute:02}", callback_data=f"minute_{pack_selection(day, hour, minute)}")
+    builder.adjust(1)  # Отображаем минуты в одном столбце
+    return builder.as_markup()
+
+
+@lru_cache(maxsize=64)
+def _week_markup(current_date, today):
+    token = pack_selection(current_date)
+    start_of_week = current_date - timedelta(days=current_date.weekday())
+    builder = InlineKeyboardBuilder()
+
+    # Добавляем кнопку "назад" перед датами
+    builder.button(text="◀️", callback_data=f"scroll_back_{token}")
+    builder.adjust(1)
+
+    for day in range(7):  # Показываем даты на текущую неделю
+        day_date = start_of_week + timedelta(days=day)
+        if day_date < today:
+            continue  # Пропускаем прошедшие даты
+        builder.button(text=format_date(day_date), callback_data=f"date_{pack_selection(day_date)}")
+    builder.adjust(1)  # Отображаем даты в одном столбце
+
+    # Добавляем кнопку для прокрутки недель вперёд
+    builder.button(text="▶️", callback_data=f"scroll_forward_{token}")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def week_markup(current_date, today=None):
+    """
+    Возвращает клавиатуру выбора даты для недели, содержащей current_date.
+
+    Клавиатуры кэшируются по паре (отображаемая дата, сегодняшняя дата); с наступлением нового дня
+    кэш очищается, так как набор прошедших дат меняется. Сегодняшняя дата у чатов в разных часовых
+    поясах может отличаться, поэтому кэш очищается только при переходе на более позднюю дату.
+    """
+    global _week_cache_day
+    if today is None:
+        today = date.today()
+    if _week_cache_day is None or today > _week_cache_day:
+        _week_markup.cache_clear()
+        _week_cache_day = today
+    return _week_markup(current_date, today)
+
+
+# Варианты откладывания доставленного напоминания, в минутах
+SNOOZE_MINUTES = (5, 15, 60)
+
+
+def reminder_markup(reminder_id):
+    """
+    Кнопки под доставленным напоминанием: отложить на SNOOZE_MINUTES минут или отметить выполненным.
+    """
+    builder = InlineKeyboardBuilder()
+    for minutes in SNOOZE_MINUTES:
+        label = f"⏰ {minutes // 60} ч" if minutes % 60 == 0 else f"⏰ {minutes} мин"
+        builder.button(text=label, callback_data=f"snooze_{minutes}_{reminder_id}")
+    builder.button(text="✅ Готово", callback_data=f"done_{reminder_id}")
+    builder.adjust(len(SNOOZE_MINUTES), 1)
+    return builder.as_markup()
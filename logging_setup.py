@@ -0,0 +1,125 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+from metrics import Counter
+
+# Логгер для частых строк о действиях пользователей; к нему применяются выборка и ограничение частоты
+USER_LOGGER = 'alarmbot.users'
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+LOG_LINES_DROPPED = Counter('reminder_log_lines_dropped_total', 'Строки журнала, отброшенные выборкой или лимитом')
+
+
+class _QueueHandler(QueueHandler):
+    """
+    QueueHandler, который не форматирует запись в вызывающем потоке.
+
+    Стандартный prepare() подставляет аргументы в сообщение ещё в event loop, чтобы запись можно было
+    передать в другой процесс. Очередь здесь внутрипроцессная, поэтому форматирование целиком
+    выполняется в потоке QueueListener.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматирует запись как одну строку JSON: время, уровень, логгер, сообщение и, при наличии, traceback.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает долю sample_rate записей и не более rate_limit записей в секунду (0 — без ограничения).
+
+    Ограничение частоты — ведро токенов ёмкостью в одну секунду потока. Отброшенные строки
+    учитываются в метрике reminder_log_lines_dropped_total.
+    """
+
+    def __init__(self, sample_rate=1.0, rate_limit=0, time_func=time.monotonic):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self._time = time_func
+        self._tokens = rate_limit
+        self._updated = time_func()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            LOG_LINES_DROPPED.inc()
+            return False
+        if self.rate_limit:
+            with self._lock:
+                now = self._time()
+                self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit)
+                self._updated = now
+                if self._tokens < 1:
+                    LOG_LINES_DROPPED.inc()
+                    return False
+                self._tokens -= 1
+        return True
+
+
+def setup_logging(directory='logs', level=logging.INFO, json_output=False, user_sample_rate=1.0,
+                  user_rate_limit=0):
+    """
+    Настраивает журнал: обработчики корневого логгера только кладут записи в очередь, а форматирование,
+    запись в консоль и файл и ротацию в полночь выполняет фоновый поток QueueListener.
+
+    Возвращает запущенный QueueListener; он останавливается (с записью оставшихся строк) при выходе.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    formatter = JsonFormatter() if json_output else logging.Formatter(TEXT_FORMAT)
+    handlers = [
+        logging.StreamHandler(),
+        TimedRotatingFileHandler(
+            os.path.join(directory, 'bot.log'),
+            when='midnight',
+            interval=1,
+            backupCount=7,
+            encoding='Windows-1251'  # Укажите кодировку здесь
+        )
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level)
+
+    user_logger = logging.getLogger(USER_LOGGER)
+    for log_filter in user_logger.filters[:]:
+        user_logger.removeFilter(log_filter)
+    if user_sample_rate < 1 or user_rate_limit:
+        user_logger.addFilter(SamplingFilter(user_sample_rate, user_rate_limit))
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
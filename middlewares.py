@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+import weakref
+
+from aiogram import BaseMiddleware
+
+from metrics import Counter, Histogram
+from state import ExpiringDict
+
+HANDLER_LATENCY = Histogram('reminder_handler_seconds', 'Время обработки обновления обработчиком aiogram',
+                            labelnames=('handler',))
+CALLBACKS_DEBOUNCED = Counter('reminder_callbacks_debounced_total',
+                              'Повторные нажатия кнопок, отброшенные без обработки')
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """
+    Замеряет время работы обработчика сообщения или нажатия кнопки, с меткой по имени функции-обработчика.
+    """
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_object = data.get('handler')
+            name = handler_object.callback.__name__ if handler_object is not None else 'unknown'
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - started)
+
+
+class ChatLockMiddleware(BaseMiddleware):
+    """
+    Обрабатывает обновления одного чата по одному, в порядке поступления; разные чаты обрабатываются параллельно.
+
+    Регистрируется как outer-middleware, чтобы под блокировкой выполнялись и фильтры, читающие состояние диалога.
+    Блокировки хранятся в WeakValueDictionary: запись чата исчезает, как только его обновления обработаны.
+    """
+
+    def __init__(self):
+        self._locks = weakref.WeakValueDictionary()  # chat_id -> asyncio.Lock
+
+    async def __call__(self, handler, event, data):
+        chat = data.get('event_chat')
+        if chat is None:
+            return await handler(event, data)
+        lock = self._locks.get(chat.id)
+        if lock is None:
+            lock = self._locks[chat.id] = asyncio.Lock()
+        async with lock:
+            return await handler(event, data)
+
+
+class CallbackGuardMiddleware(BaseMiddleware):
+    """
+    Сразу отвечает на нажатие кнопки (answerCallbackQuery в фоне), чтобы клиент Telegram не показывал
+    ожидание и не повторял запрос, и отбрасывает повторное нажатие той же кнопки того же сообщения
+    в течение window секунд.
+
+    Регистрируется как outer-middleware перед ChatLockMiddleware, чтобы ответ не ждал обработки
+    предыдущих обновлений чата.
+    """
+
+    def __init__(self, window=1.0, maxsize=10000):
+        self._recent = ExpiringDict(ttl=window, maxsize=maxsize)
+        self._answers = set()  # Ссылки на фоновые ответы, чтобы их не собрал GC
+
+    async def __call__(self, handler, event, data):
+        answer = asyncio.create_task(self._answer(event))
+        self._answers.add(answer)
+        answer.add_done_callback(self._answers.discard)
+
+        message_id = event.message.message_id if event.message is not None else event.inline_message_id
+        key = (event.from_user.id, message_id, event.data)
+        if key in self._recent:
+            CALLBACKS_DEBOUNCED.inc()
+            return None
+        self._recent[key] = True
+        return await handler(event, data)
+
+    @staticmethod
+    async def _answer(event):
+        try:
+            await event.answer()
+        except Exception as e:
+            logging.warning("Не удалось ответить на нажатие кнопки: %s", e)
@@ -0,0 +1,607 @@
+import asyncio
+import logging
+import re
+import time
+
+import asyncpg
+
+from storage import QUERY_LATENCY
+
+# Схема PostgreSQL. Номер последней применённой миграции хранится в таблице schema_version
+MIGRATIONS = [
+    '''
+    CREATE TABLE recurrences (
+        id BIGSERIAL PRIMARY KEY,
+        chat_id BIGINT NOT NULL,
+        rule TEXT NOT NULL
+    );
+    CREATE TABLE reminders (
+        id BIGSERIAL PRIMARY KEY,
+        chat_id BIGINT NOT NULL,
+        reminder_time TEXT NOT NULL,
+        reminder_ts BIGINT NOT NULL,
+        reminder_message TEXT NOT NULL,
+        is_sent INTEGER NOT NULL DEFAULT 0,
+        claimed_by TEXT,
+        lease_until BIGINT,
+        recurrence_id BIGINT,
+        snooze_ts BIGINT,
+        snoozed_by TEXT
+    );
+    CREATE INDEX idx_reminders_pending_ts ON reminders (reminder_ts) WHERE is_sent = 0;
+    CREATE INDEX idx_reminders_pending_lease ON reminders (lease_until) WHERE is_sent = 0;
+    CREATE INDEX idx_reminders_chat_ts ON reminders (chat_id, reminder_ts DESC);
+    CREATE INDEX idx_reminders_chat_sent_ts ON reminders (chat_id, is_sent, reminder_ts);
+    CREATE INDEX idx_reminders_snooze ON reminders (snooze_ts) WHERE snooze_ts IS NOT NULL;
+    CREATE TABLE chats (
+        chat_id BIGINT PRIMARY KEY,
+        timezone TEXT
+    );
+    ''',
+    '''
+    CREATE TABLE reminders_archive (
+        id BIGINT PRIMARY KEY,
+        chat_id BIGINT NOT NULL,
+        reminder_ts BIGINT NOT NULL,
+        reminder_message TEXT NOT NULL,
+        archived_at BIGINT NOT NULL
+    );
+    CREATE INDEX idx_reminders_archive_chat_ts ON reminders_archive (chat_id, reminder_ts);
+    CREATE INDEX idx_reminders_sent_ts ON reminders (reminder_ts) WHERE is_sent = 1 AND recurrence_id IS NULL;
+    ''',
+    '''
+    CREATE INDEX idx_reminders_search ON reminders
+        USING gin (to_tsvector('simple', 'chat' || abs(chat_id)::text || ' ' || reminder_message));
+    ''',
+    '''
+    CREATE INDEX idx_reminders_unclaimed ON reminders (reminder_ts) WHERE claimed_by IS NULL AND is_sent = 0;
+    ''',
+]
+
+# Выражение полнотекстового индекса idx_reminders_search: номер чата входит в него отдельным словом,
+# поэтому условие на чат выбирает из индекса только строки этого чата. Запросы должны повторять его дословно
+_SEARCH_VECTOR = "to_tsvector('simple', 'chat' || abs(r.chat_id)::text || ' ' || r.reminder_message)"
+
+# Ключ рекомендательной блокировки, под которой процессы по очереди применяют миграции
+_MIGRATION_LOCK = 7204501
+
+
+def _tsquery(chat_id, text):
+    """
+    Строит запрос to_tsquery: все слова text среди напоминаний чата chat_id, последнее — как начало слова.
+    Возвращает None, если в text нет слов.
+    """
+    words = re.findall(r'[^\W_]+', text.lower())
+    if not words:
+        return None
+    terms = [f"chat{abs(chat_id)}", *(f"'{word}'" for word in words)]
+    return ' & '.join(terms) + ':*'
+
+
+class PostgresReminderStore:
+    """
+    Хранилище напоминаний в PostgreSQL с тем же интерфейсом, что и ReminderStore (SQLite).
+
+    Запросы выполняются через пул асинхронных соединений asyncpg; каждое соединение подготавливает
+    запрос при первом выполнении и хранит подготовленные запросы в своём кэше, поэтому повторные
+    вызовы не разбираются сервером заново. Напоминания арендуются атомарным UPDATE с выборкой
+    FOR UPDATE SKIP LOCKED: несколько процессов на разных машинах не ждут друг друга и не получают
+    одну и ту же строку. Смысл аренды (claimed_by, lease_until) и разделения чатов между worker_count
+    процессами — как в ReminderStore.
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, flush_interval=0.05, worker_id=None, lease_grace=300,
+                 worker_index=0, worker_count=1):
+        self.dsn = dsn
+        self.worker_id = worker_id
+        self.lease_grace = lease_grace
+        self.worker_index = worker_index
+        self.worker_count = worker_count
+        self._min_size = min_size
+        self._max_size = max_size
+        self._flush_interval = flush_interval
+        self._pool = None
+        self._snoozes = {}  # reminder_id -> (chat_id, snooze_ts), ещё не записанные в базу
+        self._snooze_flush = None
+
+    async def open(self):
+        """
+        Создаёт пул соединений и схему базы.
+        """
+        self._pool = await asyncpg.create_pool(self.dsn, min_size=self._min_size, max_size=self._max_size)
+        await self._migrate()
+
+    async def close(self):
+        """
+        Записывает отложенные отметки и закрывает пул.
+        """
+        if self._snooze_flush is not None:
+            await self._snooze_flush
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def _migrate(self):
+        async with self._pool.acquire() as conn, conn.transaction():
+            await conn.execute('SELECT pg_advisory_xact_lock($1)', _MIGRATION_LOCK)
+            await conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)')
+            version = await conn.fetchval('SELECT version FROM schema_version')
+            if version is None:
+                await conn.execute('INSERT INTO schema_version (version) VALUES (0)')
+                version = 0
+            for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+                logging.info("Миграция базы PostgreSQL до версии %s", number)
+                await conn.execute(migration)
+                await conn.execute('UPDATE schema_version SET version = $1', number)
+
+    def _timed(self, operation, kind):
+        return QUERY_LATENCY.labels(operation, kind).time()
+
+    def _lease_until(self, reminder_ts):
+        return reminder_ts + self.lease_grace
+
+    def owns_chat(self, chat_id):
+        """
+        Возвращает True, если чат относится к части чатов этого процесса (см. ReminderStore.owns_chat).
+        """
+        return abs(chat_id) % self.worker_count == self.worker_index
+
+    def claims(self, chat_id, reminder_ts, claim_until):
+        """
+        Возвращает True, если новое напоминание арендуется добавляющим его процессом (см. ReminderStore.claims).
+        """
+        return self.owns_chat(chat_id) or reminder_ts <= claim_until
+
+    def _lease(self, chat_id, reminder_ts, claim_until):
+        if self.claims(chat_id, reminder_ts, claim_until):
+            return self.worker_id, self._lease_until(reminder_ts)
+        return None, None
+
+    # --- Напоминания ---
+
+    async def add_reminder(self, chat_id, reminder_time, reminder_message, rule=None, claim_until=0):
+        """
+        Добавляет напоминание и возвращает его идентификатор; аренда — как в ReminderStore.add_reminder.
+        """
+        reminder_ts = int(reminder_time.timestamp())
+        with self._timed('add_reminder', 'write'):
+            async with self._pool.acquire() as conn, conn.transaction():
+                recurrence_id = None
+                if rule is not None:
+                    recurrence_id = await conn.fetchval(
+                        'INSERT INTO recurrences (chat_id, rule) VALUES ($1, $2) RETURNING id', chat_id, rule)
+                return await conn.fetchval('''
+                INSERT INTO reminders (chat_id, reminder_time, reminder_ts, reminder_message, claimed_by, lease_until,
+                                       recurrence_id)
+                VALUES ($1, $2, $3, $4, $5, $6, $7)
+                RETURNING id
+                ''', chat_id, reminder_time.isoformat(timespec='seconds'), reminder_ts, reminder_message,
+                    *self._lease(chat_id, reminder_ts, claim_until), recurrence_id)
+
+    async def add_reminders(self, chat_id, reminders, schedule_until, claim_until=0):
+        """
+        Добавляет пачку напоминаний одной транзакцией (см. ReminderStore.add_reminders).
+        Напоминания вставляются одним INSERT ... SELECT FROM unnest(...) вместо запроса на строку.
+        """
+        with self._timed('add_reminders', 'write'):
+            async with self._pool.acquire() as conn, conn.transaction():
+                rules = {}
+                columns = ([], [], [], [], [], [])
+                for reminder_time, reminder_message, rule in reminders:
+                    recurrence_id = None
+                    if rule is not None:
+                        recurrence_id = await conn.fetchval(
+                            'INSERT INTO recurrences (chat_id, rule) VALUES ($1, $2) RETURNING id', chat_id, rule)
+                        rules[recurrence_id] = rule
+                    reminder_ts = int(reminder_time.timestamp())
+                    for column, value in zip(columns, (reminder_time.isoformat(timespec='seconds'), reminder_ts,
+                                                       reminder_message,
+                                                       *self._lease(chat_id, reminder_ts, claim_until),
+                                                       recurrence_id)):
+                        column.append(value)
+                rows = await conn.fetch('''
+                INSERT INTO reminders (chat_id, reminder_time, reminder_ts, reminder_message, claimed_by, lease_until,
+                                       recurrence_id)
+                SELECT $1, t.reminder_time, t.reminder_ts, t.reminder_message, t.claimed_by, t.lease_until,
+                       t.recurrence_id
+                FROM unnest($2::text[], $3::bigint[], $4::text[], $5::text[], $6::bigint[], $7::bigint[])
+                    AS t (reminder_time, reminder_ts, reminder_message, claimed_by, lease_until, recurrence_id)
+                RETURNING id, reminder_ts, reminder_message, claimed_by, recurrence_id
+                ''', chat_id, *columns)
+        return [(row['id'], row['reminder_ts'], row['reminder_message'], rules.get(row['recurrence_id']))
+                for row in rows
+                if row['reminder_ts'] <= schedule_until and row['claimed_by'] == self.worker_id]
+
+    async def delete_reminder(self, chat_id, reminder_id):
+        """
+        Удаляет напоминание чата chat_id вместе с его правилом повторения (см. ReminderStore.delete_reminder).
+        """
+        with self._timed('delete_reminder', 'write'):
+            async with self._pool.acquire() as conn, conn.transaction():
+                row = await conn.fetchrow('''
+                DELETE FROM reminders WHERE id = $1 AND chat_id = $2 RETURNING recurrence_id
+                ''', reminder_id, chat_id)
+                if row is not None and row['recurrence_id'] is not None:
+                    await conn.execute('DELETE FROM recurrences WHERE id = $1', row['recurrence_id'])
+        return row is not None
+
+    async def claim_for_sending(self, reminder_id):
+        """
+        Атомарно отмечает напоминание как отправленное перед отправкой (см. ReminderStore.claim_for_sending).
+        """
+        with self._timed('claim_for_sending', 'write'):
+            status = await self._pool.execute('''
+            UPDATE reminders
+            SET is_sent = 1
+            WHERE id = $1 AND is_sent = 0 AND (claimed_by IS NULL OR claimed_by = $2)
+            ''', reminder_id, self.worker_id)
+        return status == 'UPDATE 1'
+
+    async def advance_recurring(self, reminder_id, reminder_ts, next_time):
+        """
+        Забирает срабатывание повторяющегося напоминания и переносит его на next_time
+        (см. ReminderStore.advance_recurring).
+        """
+        next_ts = int(next_time.timestamp())
+        with self._timed('advance_recurring', 'write'):
+            status = await self._pool.execute('''
+            UPDATE reminders
+            SET reminder_ts = $1, reminder_time = $2, lease_until = $3
+            WHERE id = $4 AND reminder_ts = $5 AND is_sent = 0 AND (claimed_by IS NULL OR claimed_by = $6)
+            ''', next_ts, next_time.isoformat(timespec='seconds'), self._lease_until(next_ts), reminder_id,
+                reminder_ts, self.worker_id)
+        return status == 'UPDATE 1'
+
+    def snooze(self, chat_id, reminder_id, snooze_ts):
+        """
+        Откладывает повторную отправку напоминания чата chat_id до snooze_ts (None — отменяет её).
+
+        Как и в ReminderStore, не ждёт записи: отметки копятся flush_interval секунд и записываются
+        одним запросом; повторные нажатия для одного напоминания схлопываются.
+        """
+        self._snoozes[reminder_id] = (chat_id, snooze_ts)
+        if self._snooze_flush is None:
+            self._snooze_flush = asyncio.create_task(self._flush_snoozes())
+
+    async def _flush_snoozes(self):
+        await asyncio.sleep(self._flush_interval)
+        snoozes, self._snoozes = self._snoozes, {}
+        self._snooze_flush = None
+        try:
+            with self._timed('snooze', 'write'):
+                await self._pool.executemany('''
+                UPDATE reminders
+                SET snooze_ts = $1, snoozed_by = $2
+                WHERE id = $3 AND chat_id = $4
+                ''', [(snooze_ts, self.worker_id, reminder_id, chat_id)
+                      for reminder_id, (chat_id, snooze_ts) in snoozes.items()])
+        except Exception as e:
+            logging.error("Ошибка фоновой записи в базу: %s", e)
+
+    async def claim_snooze(self, reminder_id, snooze_ts):
+        """
+        Атомарно забирает отложенную отправку для отправки (см. ReminderStore.claim_snooze).
+        """
+        with self._timed('claim_snooze', 'write'):
+            status = await self._pool.execute('''
+            UPDATE reminders
+            SET snooze_ts = NULL
+            WHERE id = $1 AND snooze_ts = $2 AND snoozed_by = $3
+            ''', reminder_id, snooze_ts, self.worker_id)
+        return status == 'UPDATE 1'
+
+    async def claim_snoozes(self, after, until):
+        """
+        Возвращает отложенные отправки этого процесса в (after, until] и забирает просроченные отправки
+        других процессов (см. ReminderStore.claim_snoozes).
+        """
+        with self._timed('claim_snoozes', 'write'):
+            rows = await self._pool.fetch('''
+            WITH due AS (
+                SELECT id FROM reminders
+                WHERE snooze_ts IS NOT NULL
+                  AND ((snooze_ts > $1 AND snooze_ts <= $2 AND snoozed_by = $3) OR snooze_ts < $4)
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE reminders r
+            SET snoozed_by = $3
+            FROM due
+            WHERE r.id = due.id
+            RETURNING r.id, r.chat_id, r.snooze_ts, r.reminder_message
+            ''', after, until, self.worker_id, int(time.time()) - self.lease_grace)
+        return [tuple(row) for row in rows]
+
+    async def mark_unsent(self, reminder_ids, not_before):
+        """
+        Снимает отметку об отправке с недоставленных напоминаний не старше not_before и возвращает их число
+        (см. ReminderStore.mark_unsent).
+        """
+        with self._timed('mark_unsent', 'write'):
+            status = await self._pool.execute('''
+            UPDATE reminders SET is_sent = 0 WHERE id = ANY($1::bigint[]) AND is_sent = 1 AND reminder_ts >= $2
+            ''', list(reminder_ids), not_before)
+        return int(status.split()[-1])
+
+    async def restore_snoozes(self, snoozes, not_before):
+        """
+        Возвращает недоставленные отложенные отправки в базу и возвращает их число
+        (см. ReminderStore.restore_snoozes).
+        """
+        snoozes = [(reminder_id, snooze_ts) for reminder_id, snooze_ts in snoozes if snooze_ts >= not_before]
+        with self._timed('restore_snoozes', 'write'):
+            status = await self._pool.execute('''
+            UPDATE reminders r
+            SET snooze_ts = t.snooze_ts, snoozed_by = $3
+            FROM unnest($1::bigint[], $2::bigint[]) AS t (id, snooze_ts)
+            WHERE r.id = t.id AND r.snooze_ts IS NULL
+            ''', [row[0] for row in snoozes], [row[1] for row in snoozes], self.worker_id)
+        return int(status.split()[-1])
+
+    async def reminders_page(self, chat_id, after, cursor=None, backward=False, limit=10, pending=False):
+        """
+        Возвращает страницу напоминаний пользователя и признак продолжения (см. ReminderStore.reminders_page).
+        """
+        conditions = ['r.chat_id = $1', 'r.reminder_ts > $2']
+        params = [chat_id, after]
+        if pending:
+            conditions.append('r.is_sent = 0')
+        if cursor is not None:
+            conditions.append(f"(r.reminder_ts, r.id) {'<' if backward else '>'} ($3, $4)")
+            params.extend(cursor)
+        order = 'DESC' if backward else 'ASC'
+        query = f'''
+        SELECT r.id, r.reminder_ts, r.reminder_message, r.is_sent, c.rule
+        FROM reminders r
+        LEFT JOIN recurrences c ON c.id = r.recurrence_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY r.reminder_ts {order}, r.id {order}
+        LIMIT ${len(params) + 1}
+        '''
+        with self._timed('reminders_page', 'read'):
+            rows = [tuple(row) for row in await self._pool.fetch(query, *params, limit + 1)]
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+        return rows, has_more
+
+    async def last_past_reminder(self, chat_id, before):
+        """
+        Возвращает (reminder_ts, reminder_message) последнего напоминания не позже before или None.
+        """
+        with self._timed('last_past_reminder', 'read'):
+            row = await self._pool.fetchrow('''
+            SELECT reminder_ts, reminder_message
+            FROM reminders
+            WHERE chat_id = $1 AND reminder_ts <= $2
+            ORDER BY reminder_ts DESC
+            LIMIT 1
+            ''', chat_id, before)
+        return tuple(row) if row else None
+
+    async def recent_messages(self, chat_id, limit=5):
+        """
+        Возвращает последние различные тексты напоминаний пользователя.
+        """
+        messages = []
+        with self._timed('recent_messages', 'read'):
+            async with self._pool.acquire() as conn, conn.transaction():
+                async for row in conn.cursor('''
+                SELECT reminder_message
+                FROM reminders
+                WHERE chat_id = $1
+                ORDER BY reminder_ts DESC
+                ''', chat_id, prefetch=limit * 4):
+                    if row[0] not in messages:
+                        messages.append(row[0])
+                        if len(messages) == limit:
+                            break
+        return messages
+
+    async def search_reminders(self, chat_id, text, offset=0, limit=10):
+        """
+        Ищет напоминания пользователя по словам text (см. ReminderStore.search_reminders); строки
+        упорядочены по ts_rank.
+        """
+        query = _tsquery(chat_id, text)
+        if query is None:
+            return [], False
+        with self._timed('search_reminders', 'read'):
+            rows = [tuple(row) for row in await self._pool.fetch(f'''
+            SELECT r.id, r.reminder_ts, r.reminder_message, r.is_sent, c.rule
+            FROM reminders r
+            LEFT JOIN recurrences c ON c.id = r.recurrence_id
+            CROSS JOIN to_tsquery('simple', $2) query
+            WHERE {_SEARCH_VECTOR} @@ query AND r.chat_id = $1
+            ORDER BY ts_rank({_SEARCH_VECTOR}, query) DESC, r.reminder_ts DESC
+            LIMIT $3 OFFSET $4
+            ''', chat_id, query, limit + 1, offset)]
+        return rows[:limit], len(rows) > limit
+
+    async def complete_messages(self, chat_id, text, limit=5):
+        """
+        Возвращает последние различные тексты напоминаний пользователя, содержащие слова text
+        (см. ReminderStore.complete_messages).
+        """
+        query = _tsquery(chat_id, text)
+        if query is None:
+            return []
+        with self._timed('complete_messages', 'read'):
+            rows = await self._pool.fetch(f'''
+            SELECT reminder_message
+            FROM (
+                SELECT DISTINCT ON (r.reminder_message) r.reminder_message, r.reminder_ts
+                FROM reminders r
+                WHERE {_SEARCH_VECTOR} @@ to_tsquery('simple', $2) AND r.chat_id = $1
+                ORDER BY r.reminder_message, r.reminder_ts DESC
+            ) latest
+            ORDER BY reminder_ts DESC
+            LIMIT $3
+            ''', chat_id, query, limit)
+        return [row[0] for row in rows]
+
+    async def export_reminders(self, chat_id, write, chunk_size=500):
+        """
+        Вызывает write(row) для каждого напоминания пользователя (см. ReminderStore.export_reminders).
+
+        Строки читаются серверным курсором пачками по chunk_size, и каждая пачка передаётся write
+        в отдельном потоке, чтобы запись в файл не блокировала event loop.
+        """
+        count = 0
+        with self._timed('export_reminders', 'read'):
+            async with self._pool.acquire() as conn, conn.transaction():
+                chunk = []
+                async for row in conn.cursor('''
+                SELECT r.reminder_ts, r.reminder_message, r.is_sent, c.rule
+                FROM reminders r
+                LEFT JOIN recurrences c ON c.id = r.recurrence_id
+                WHERE r.chat_id = $1
+                ORDER BY r.reminder_ts, r.id
+                ''', chat_id, prefetch=chunk_size):
+                    chunk.append(tuple(row))
+                    if len(chunk) == chunk_size:
+                        await asyncio.to_thread(_write_rows, write, chunk)
+                        count += len(chunk)
+                        chunk = []
+                if chunk:
+                    await asyncio.to_thread(_write_rows, write, chunk)
+                    count += len(chunk)
+        return count
+
+    async def claim_due(self, after, until):
+        """
+        Арендует для текущего процесса и возвращает неотправленные напоминания (см. ReminderStore.claim_due).
+
+        Выборка и аренда — один UPDATE; строки, которые в этот момент арендует другой процесс,
+        пропускаются (SKIP LOCKED) и достанутся ему.
+        """
+        with self._timed('claim_due', 'write'):
+            rows = await self._pool.fetch('''
+            WITH own AS (
+                SELECT id FROM reminders
+                WHERE is_sent = 0 AND reminder_ts > $1 AND reminder_ts <= $2 AND claimed_by = $5
+                FOR UPDATE SKIP LOCKED
+            ), unclaimed AS (
+                SELECT id FROM reminders
+                WHERE claimed_by IS NULL AND is_sent = 0 AND reminder_ts > least($1, $7) AND reminder_ts <= $2
+                  AND abs(chat_id) % $3 = $4
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE reminders r
+            SET claimed_by = $5, lease_until = r.reminder_ts + $6
+            WHERE r.id IN (SELECT id FROM own UNION ALL SELECT id FROM unclaimed)
+            RETURNING r.id, r.chat_id, r.reminder_ts, r.reminder_message,
+                      (SELECT c.rule FROM recurrences c WHERE c.id = r.recurrence_id)
+            ''', after, until, self.worker_count, self.worker_index, self.worker_id, self.lease_grace,
+                int(time.time()))
+        return [tuple(row) for row in rows]
+
+    async def claim_overdue(self, before, limit):
+        """
+        Арендует и возвращает не больше limit самых старых просроченных напоминаний
+        (см. ReminderStore.claim_overdue).
+        """
+        now = int(time.time())
+        with self._timed('claim_overdue', 'write'):
+            rows = await self._pool.fetch('''
+            WITH due AS (
+                SELECT id FROM reminders
+                WHERE is_sent = 0 AND reminder_ts <= $1
+                  AND (claimed_by = $2 OR (claimed_by IS NULL AND abs(chat_id) % $3 = $4) OR lease_until < $5)
+                ORDER BY reminder_ts
+                LIMIT $6
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE reminders r
+            SET claimed_by = $2, lease_until = $5 + $7
+            FROM due
+            WHERE r.id = due.id
+            RETURNING r.id, r.chat_id, r.reminder_ts, r.reminder_message,
+                      (SELECT c.rule FROM recurrences c WHERE c.id = r.recurrence_id)
+            ''', before, self.worker_id, self.worker_count, self.worker_index, now, limit, self.lease_grace)
+        return sorted((tuple(row) for row in rows), key=lambda row: row[2])
+
+    async def claim_many_for_sending(self, reminder_ids):
+        """
+        Отмечает пачку напоминаний отправленными одним запросом и возвращает идентификаторы тех,
+        что удалось забрать (см. ReminderStore.claim_many_for_sending).
+        """
+        with self._timed('claim_many_for_sending', 'write'):
+            rows = await self._pool.fetch('''
+            UPDATE reminders
+            SET is_sent = 1
+            WHERE id = ANY($1::bigint[]) AND is_sent = 0 AND (claimed_by IS NULL OR claimed_by = $2)
+            RETURNING id
+            ''', list(reminder_ids), self.worker_id)
+        return [row[0] for row in rows]
+
+    # --- Архив ---
+
+    async def archive_sent(self, before, limit):
+        """
+        Переносит до limit отправленных однократных напоминаний со временем раньше before в таблицу
+        reminders_archive одним запросом и возвращает число перенесённых строк (см. ReminderStore.archive_sent).
+        """
+        pending = list(self._snoozes)
+        with self._timed('archive_sent', 'write'):
+            status = await self._pool.execute('''
+            WITH moved AS (
+                DELETE FROM reminders
+                WHERE id IN (
+                    SELECT id FROM reminders
+                    WHERE is_sent = 1 AND reminder_ts < $1 AND recurrence_id IS NULL AND snooze_ts IS NULL
+                      AND id <> ALL($3::bigint[])
+                    ORDER BY reminder_ts
+                    LIMIT $2
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, chat_id, reminder_ts, reminder_message
+            )
+            INSERT INTO reminders_archive (id, chat_id, reminder_ts, reminder_message, archived_at)
+            SELECT id, chat_id, reminder_ts, reminder_message, $4 FROM moved
+            ON CONFLICT (id) DO NOTHING
+            ''', before, limit, pending, int(time.time()))
+        return int(status.split()[-1])
+
+    async def incremental_vacuum(self, pages):
+        """
+        Освобождённое место в PostgreSQL переиспользует autovacuum; возвращает None, как SQLite-база
+        без auto_vacuum=INCREMENTAL.
+        """
+        return None
+
+    async def database_size(self):
+        """
+        Возвращает размер базы и объём свободного места (для PostgreSQL не вычисляется — None) в байтах.
+        """
+        with self._timed('database_size', 'read'):
+            size = await self._pool.fetchval('SELECT pg_database_size(current_database())')
+        return size, None
+
+    async def count_reminders(self):
+        """
+        Возвращает число строк в рабочей таблице напоминаний (без архива).
+        """
+        with self._timed('count_reminders', 'read'):
+            return await self._pool.fetchval('SELECT count(*) FROM reminders')
+
+    # --- Чаты ---
+
+    async def chat_timezone(self, chat_id):
+        """
+        Возвращает название часового пояса чата или None, если он не задан.
+        """
+        with self._timed('chat_timezone', 'read'):
+            return await self._pool.fetchval('SELECT timezone FROM chats WHERE chat_id = $1', chat_id)
+
+    async def set_chat_timezone(self, chat_id, timezone):
+        with self._timed('set_chat_timezone', 'write'):
+            await self._pool.execute('''
+            INSERT INTO chats (chat_id, timezone) VALUES ($1, $2)
+            ON CONFLICT (chat_id) DO UPDATE SET timezone = excluded.timezone
+            ''', chat_id, timezone)
+
+
+def _write_rows(write, rows):
+    for row in rows:
+        write(row)
@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from keyboards import days_ru
+
+# Границы полей выражения cron: минуты, часы, день месяца, месяц, день недели (0 и 7 — воскресенье)
+_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+# Насколько далеко вперёд ищется следующее срабатывание, прежде чем правило считается невыполнимым
+_SEARCH_LIMIT = timedelta(days=366 * 5)
+
+
+def _parse_field(text, low, high):
+    try:
+        return _parse_values(text, low, high)
+    except ValueError:
+        raise ValueError(f"Неверное поле выражения cron: {text}") from None
+
+
+def _parse_values(text, low, high):
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Недопустимый шаг: {step_text}")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = end = int(part)
+            if step > 1:
+                end = high
+        if not low <= start <= end <= high:
+            raise ValueError(f"Значение вне диапазона {low}-{high}: {part}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class Rule:
+    """
+    Правило повторения в формате cron из пяти полей: «минуты часы день месяц день_недели».
+
+    Поддерживаются *, списки через запятую, диапазоны и шаги (*/15, 1-5). Как и в cron, если заданы
+    и день месяца, и день недели, подходит любой из них.
+    """
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("Выражение cron должно состоять из пяти полей")
+        self.expression = ' '.join(fields)
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(text, low, high) for text, (low, high) in zip(fields, _FIELDS))
+        # Дни недели cron (0 — воскресенье) в нумерации datetime.weekday() (0 — понедельник)
+        self.weekdays = frozenset((day - 1) % 7 for day in weekdays)
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, moment):
+        day_match = moment.day in self.days
+        weekday_match = moment.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_match and weekday_match
+        return day_match or weekday_match
+
+    def next_after(self, moment):
+        """
+        Возвращает ближайшее срабатывание строго позже moment (datetime с часовым поясом)
+        в том же часовом поясе.
+        """
+        zone = moment.tzinfo
+        candidate = moment.replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + _SEARCH_LIMIT
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)
+                candidate = datetime(candidate.year + year, month + 1, 1)
+            elif not self._day_matches(candidate):
+                candidate = datetime(candidate.year, candidate.month, candidate.day) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate.replace(tzinfo=zone)
+        raise ValueError(f"Правило «{self.expression}» не срабатывает")
+
+    def describe(self):
+        """
+        Возвращает описание правила для пользователя, например «ежедневно в 09:00».
+        """
+        fields = self.expression.split()
+        if len(self.minutes) == 1 and len(self.hours) == 1 and fields[2] == '*' and fields[3] == '*':
+            at = f"в {min(self.hours):02}:{min(self.minutes):02}"
+            if fields[4] == '*':
+                return f"ежедневно {at}"
+            if self.weekdays == frozenset(range(5)):
+                return f"по будням {at}"
+            if len(self.weekdays) == 1:
+                return f"еженедельно, {days_ru[min(self.weekdays)]} {at}"
+        return f"по расписанию «{self.expression}»"
+
+
+@lru_cache(maxsize=1024)
+def parse_rule(expression):
+    """
+    Возвращает разобранное правило; результат кэшируется, так как правила проверяются при каждом срабатывании.
+    """
+    return Rule(expression)
+
+
+def daily_rule(hour, minute):
+    return f"{minute} {hour} * * *"
+
+
+def weekdays_rule(hour, minute):
+    return f"{minute} {hour} * * 1-5"
+
+
+def weekly_rule(weekday, hour, minute):
+    """
+    Правило для дня недели weekday в нумерации datetime.weekday() (0 — понедельник).
+    """
+    return f"{minute} {hour} * * {(weekday + 1) % 7}"
+
+
+def _parse_time(text):
+    try:
+        hour, minute = (int(part) for part in text.split(':'))
+    except ValueError:
+        hour = minute = -1
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError(f"Неверное время: {text}")
+    return hour, minute
+
+
+def parse_command(text):
+    """
+    Разбирает аргументы команды /repeat и возвращает (выражение cron, текст напоминания):
+    - daily 09:00 текст
+    - weekdays 09:00 текст
+    - weekly пн 09:00 текст
+    - cron 0 9 * * 1-5 текст
+
+    При ошибке в расписании выбрасывает ValueError.
+    """
+    words = text.split()
+    if not words:
+        raise ValueError("Не указано расписание")
+    kind = words[0].lower()
+    if kind in ('daily', 'weekdays'):
+        if len(words) < 2:
+            raise ValueError("Не указано время")
+        rule_words = 2
+        hour, minute = _parse_time(words[1])
+        rule = daily_rule(hour, minute) if kind == 'daily' else weekdays_rule(hour, minute)
+    elif kind == 'weekly':
+        weekdays = {name.lower(): number for number, name in days_ru.items()}
+        if len(words) < 3 or words[1].lower() not in weekdays:
+            raise ValueError("Укажите день недели: пн, вт, ср, чт, пт, сб или вс")
+        rule_words = 3
+        hour, minute = _parse_time(words[2])
+        rule = weekly_rule(weekdays[words[1].lower()], hour, minute)
+    elif kind == 'cron':
+        rule_words = 6
+        rule = ' '.join(words[1:6])
+    else:
+        raise ValueError(f"Неизвестное расписание: {words[0]}")
+
+    message = ' '.join(words[rule_words:])
+    if not message:
+        raise ValueError("Не указан текст напоминания")
+    parse_rule(rule)  # Проверяем выражение
+    return rule, message
@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+# Маркер отменённой записи в куче (ленивое удаление)
+_REMOVED = object()
+
+
+class ReminderScheduler:
+    """
+    Планировщик напоминаний: одна min-куча по времени срабатывания и одна корутина-диспетчер,
+    которая спит до ближайшего дедлайна.
+
+    Вставка и отмена выполняются за O(log n) (отмена — ленивая, с периодическим сжатием кучи),
+    поэтому число задач и таймеров в event loop не зависит от количества ожидающих напоминаний.
+    """
+
+    def __init__(self, callback, time_func=time.time):
+        self._callback = callback
+        self._time = time_func
+        self._heap = []  # Элементы кучи: [due, seq, key, args]
+        self._entries = {}  # key -> элемент кучи
+        self._removed = 0  # Количество отменённых элементов, ещё лежащих в куче
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._running = set()  # Ссылки на запущенные колбэки, чтобы их не собрал GC
+        self._task = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, due, *args):
+        """
+        Планирует вызов callback(*args) на момент due (epoch-секунды).
+        Повторное планирование того же ключа заменяет предыдущее.
+        """
+        if key in self._entries:
+            self.cancel(key)
+        entry = [due, next(self._counter), key, args]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            # Новый ближайший дедлайн — будим диспетчер, чтобы он пересчитал время сна
+            self._wakeup.set()
+
+    def schedule_many(self, items):
+        """
+        Планирует пачку вызовов: items — пары (key, due, args). Куча перестраивается один раз за O(n),
+        а не n вставками, поэтому массовая загрузка не требует n пробуждений диспетчера.
+        """
+        for key, due, args in items:
+            if key in self._entries:
+                self.cancel(key)
+            entry = [due, next(self._counter), key, tuple(args)]
+            self._entries[key] = entry
+            self._heap.append(entry)
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def cancel(self, key):
+        """
+        Отменяет запланированный вызов. Возвращает True, если он был найден.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[2] = _REMOVED
+        entry[3] = ()
+        self._removed += 1
+        if self._removed > len(self._heap) // 2:
+            self._compact()
+        return True
+
+    def _compact(self):
+        """
+        Удаляет отменённые элементы из кучи, чтобы память не росла при частых отменах.
+        """
+        self._heap = [entry for entry in self._heap if entry[2] is not _REMOVED]
+        heapq.heapify(self._heap)
+        self._removed = 0
+
+    def _pop_due(self, now):
+        """
+        Извлекает из кучи все элементы, время которых наступило.
+        """
+        due_entries = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if entry[2] is _REMOVED:
+                self._removed -= 1
+                continue
+            del self._entries[entry[2]]
+            due_entries.append(entry)
+        return due_entries
+
+    def _next_delay(self):
+        """
+        Возвращает время до ближайшего дедлайна или None, если куча пуста.
+        """
+        while self._heap and self._heap[0][2] is _REMOVED:
+            heapq.heappop(self._heap)
+            self._removed -= 1
+        if not self._heap:
+            return None
+        return self._heap[0][0] - self._time()
+
+    def _fire(self, entry):
+        task = asyncio.create_task(self._callback(*entry[3]))
+        self._running.add(task)
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Ошибка при отправке напоминания", exc_info=task.exception())
+
+    async def run(self):
+        """
+        Корутина-диспетчер: спит до ближайшего дедлайна и запускает наступившие напоминания.
+        """
+        while True:
+            delay = self._next_delay()
+            if delay is None or delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            for entry in self._pop_due(self._time()):
+                self._fire(entry)
+
+    def start(self):
+        """
+        Запускает диспетчер в текущем event loop.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
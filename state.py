@@ -0,0 +1,104 @@
+import time
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+
+
+class ExpiringDict(MutableMapping):
+    """
+    Словарь с ограниченным временем жизни и числом записей.
+
+    Запись удаляется через ttl секунд после последней установки; при превышении maxsize вытесняются
+    самые старые записи. Используется для временного состояния диалогов, которые пользователь
+    может бросить на середине.
+    """
+
+    def __init__(self, ttl, maxsize, time_func=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._time = time_func
+        self._data = OrderedDict()  # key -> (expires_at, value), в порядке установки
+
+    def _expire(self):
+        now = self._time()
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[key]
+
+    def __getitem__(self, key):
+        expires_at, value = self._data[key]
+        if expires_at <= self._time():
+            del self._data[key]
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = (self._time() + self.ttl, value)
+        self._expire()
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __iter__(self):
+        self._expire()
+        return iter(list(self._data))
+
+    def __len__(self):
+        self._expire()
+        return len(self._data)
+
+
+class RecentMessages:
+    """
+    Кэш последних различных текстов напоминаний по чатам.
+
+    Для каждого чата хранится короткий список (не длиннее limit) от нового к старому; кэш ограничен
+    maxsize чатами и вытесняет давно не использованные. Список чата обновляется при добавлении
+    напоминания, поэтому после первого обращения к базе мастер /set читает тексты только из памяти.
+    """
+
+    def __init__(self, maxsize, limit=5):
+        self.maxsize = maxsize
+        self.limit = limit
+        self._data = OrderedDict()  # chat_id -> deque текстов, в порядке последнего использования
+
+    def get(self, chat_id):
+        """
+        Возвращает список текстов чата или None, если чата нет в кэше.
+        """
+        messages = self._data.get(chat_id)
+        if messages is None:
+            return None
+        self._data.move_to_end(chat_id)
+        return list(messages)
+
+    def put(self, chat_id, messages):
+        """
+        Заполняет кэш чата списком, прочитанным из базы.
+        """
+        self._data[chat_id] = deque(messages[:self.limit], maxlen=self.limit)
+        self._data.move_to_end(chat_id)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def add(self, chat_id, message):
+        """
+        Поднимает текст нового напоминания в начало списка чата, если чат уже в кэше.
+
+        Чаты, которых нет в кэше, не заполняются: их список будет целиком прочитан из базы.
+        """
+        messages = self._data.get(chat_id)
+        if messages is None:
+            return
+        try:
+            messages.remove(message)
+        except ValueError:
+            pass
+        messages.appendleft(message)
+
+    def discard(self, chat_id):
+        self._data.pop(chat_id, None)
@@ -0,0 +1,1017 @@
+import asyncio
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+
+from metrics import Histogram
+
+FLUSH_SIZE = Histogram('reminder_store_flush_size', 'Число записей, зафиксированных одной транзакцией',
+                       buckets=(1, 5, 10, 50, 100, 500, 1000, 5000))
+FLUSH_LATENCY = Histogram('reminder_store_flush_latency_seconds', 'Время выполнения и фиксации одной пачки записей')
+QUERY_LATENCY = Histogram('reminder_store_query_seconds', 'Время выполнения одной операции с базой в потоке',
+                          labelnames=('operation', 'kind'))
+COMMIT_LATENCY = Histogram('reminder_store_commit_seconds', 'Время выполнения COMMIT групповой транзакции')
+
+# Число строк, обрабатываемых одной транзакцией при миграции больших таблиц
+MIGRATION_BATCH_SIZE = 5000
+
+# Наибольшая длина префикса в индексе reminders_fts (prefix='2 3')
+SEARCH_PREFIX_LENGTH = 3
+
+
+class ReminderStore:
+    """
+    Асинхронный доступ к базе напоминаний, не блокирующий event loop.
+
+    Все записи выполняет отдельный поток-писатель. Он работает как буфер отложенной записи: собирает
+    задания в течение flush_interval секунд или до max_batch заданий и выполняет их одной транзакцией
+    с одним COMMIT (групповая фиксация), каждое — в своей точке сохранения, чтобы ошибка одного задания
+    не откатывала остальные. Вызывающий код получает результат только после фиксации транзакции.
+
+    Чтения выполняются небольшим пулом потоков, у каждого из которых своё соединение. База открывается
+    в режиме WAL, поэтому чтения не ждут записи.
+
+    Несколько процессов бота могут работать с одной базой: напоминание, загруженное в планировщик,
+    арендуется процессом worker_id (claimed_by) до времени напоминания плюс lease_grace секунд.
+    Аренды упавшего процесса истекают, и его напоминания забирают оставшиеся процессы. Новые напоминания
+    распределяются между worker_count процессами по остатку от деления chat_id: процесс, принявший обновление,
+    арендует напоминание сразу, только если чат относится к его части (см. claims), а остальные записывает
+    без аренды — их забирает claim_due процесса, которому принадлежит чат.
+    """
+
+    def __init__(self, path, readers=4, max_batch=500, flush_interval=0.05, worker_id=None, lease_grace=300,
+                 worker_index=0, worker_count=1):
+        self.path = path
+        self.worker_id = worker_id
+        self.lease_grace = lease_grace
+        self.worker_index = worker_index
+        self.worker_count = worker_count
+        self._max_batch = max_batch
+        self._flush_interval = flush_interval
+        self._write_queue = queue.Queue()
+        self._writer = None
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='reminder-store-reader')
+        self._local = threading.local()
+        self._reader_connections = []
+        self._loop = None
+        self._snoozes = {}  # reminder_id -> (chat_id, snooze_ts), ещё не записанные в базу
+        self._snooze_lock = threading.Lock()
+        self._snooze_flush_queued = False
+
+    def _connect(self):
+        """
+        Открывает соединение с базой в режиме WAL и synchronous=NORMAL.
+
+        auto_vacuum=INCREMENTAL действует только для новой базы (до создания первой таблицы): освобождённые
+        страницы возвращаются системе через PRAGMA incremental_vacuum. Существующую базу переводит
+        в этот режим только полный VACUUM.
+        """
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL;')
+        conn.execute('PRAGMA journal_mode=WAL;')
+        conn.execute('PRAGMA synchronous=NORMAL;')
+        conn.execute('PRAGMA busy_timeout=5000;')
+        conn.create_function('search_relevance', 2, _search_relevance, deterministic=True)
+        return conn
+
+    async def open(self):
+        """
+        Запускает поток-писатель и создаёт схему базы.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._writer = threading.Thread(target=self._writer_loop, name='reminder-store-writer', daemon=True)
+        self._writer.start()
+        await self._migrate()
+
+    async def close(self):
+        """
+        Дожидается выполнения поставленных записей и закрывает соединения.
+        """
+        if self._writer is not None:
+            self._write_queue.put(None)
+            await asyncio.to_thread(self._writer.join)
+            self._writer = None
+        self._readers.shutdown(wait=True)
+        for conn in self._reader_connections:
+            conn.close()
+
+    async def _migrate(self):
+        """
+        Применяет недостающие миграции схемы по порядку.
+
+        Номер последней применённой миграции хранится в PRAGMA user_version. Миграция вызывается
+        повторно, каждый раз отдельной транзакцией, пока не вернёт True, — так большие таблицы
+        преобразуются пачками и не блокируют запись другим процессам надолго. Номер версии
+        записывается в одной транзакции с последним шагом миграции.
+        """
+        version = await self._write('migrate', lambda conn: conn.execute('PRAGMA user_version;').fetchone()[0])
+        for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+            logging.info("Миграция базы до версии %s: %s", number, migration.__doc__.strip().splitlines()[0])
+            state = {}
+            while not await self._write('migrate', partial(_migration_step, migration, number, state)):
+                pass
+
+    # --- Выполнение заданий ---
+
+    def _writer_loop(self):
+        conn = self._connect()
+        try:
+            stopping = False
+            while not stopping:
+                job = self._write_queue.get()
+                if job is None:
+                    break
+                jobs = [job]
+                deadline = time.monotonic() + self._flush_interval
+                while len(jobs) < self._max_batch:
+                    try:
+                        job = self._write_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        stopping = True
+                        break
+                    jobs.append(job)
+                self._run_batch(conn, jobs)
+        finally:
+            conn.close()
+
+    def _run_batch(self, conn, jobs):
+        """
+        Выполняет пачку заданий на запись в одной транзакции.
+        """
+        results = []
+        started = time.perf_counter()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for func, future, operation in jobs:
+                conn.execute('SAVEPOINT job')
+                job_started = time.perf_counter()
+                try:
+                    result = func(conn)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO job')
+                    results.append((future, None, e))
+                else:
+                    results.append((future, result, None))
+                QUERY_LATENCY.labels(operation, 'write').observe(time.perf_counter() - job_started)
+                conn.execute('RELEASE job')
+            with COMMIT_LATENCY.time():
+                conn.execute('COMMIT')
+        except Exception as e:
+            logging.exception("Ошибка при фиксации транзакции")
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            results = [(future, None, e) for _, future, _ in jobs]
+        FLUSH_LATENCY.observe(time.perf_counter() - started)
+        FLUSH_SIZE.observe(len(jobs))
+        for future, result, error in results:
+            self._loop.call_soon_threadsafe(_resolve, future, result, error)
+
+    async def _write(self, operation, func):
+        """
+        Ставит функцию func(conn) в очередь потока-писателя и ждёт фиксации её транзакции.
+        operation — имя операции для метрики reminder_store_query_seconds.
+        """
+        future = self._loop.create_future()
+        self._write_queue.put((func, future, operation))
+        return await future
+
+    def _reader_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            self._reader_connections.append(conn)
+        return conn
+
+    async def _read(self, operation, func):
+        """
+        Выполняет функцию func(conn) в пуле читающих потоков.
+        operation — имя операции для метрики reminder_store_query_seconds.
+        """
+        return await self._loop.run_in_executor(self._readers, self._run_read, operation, func)
+
+    def _run_read(self, operation, func):
+        conn = self._reader_connection()
+        with QUERY_LATENCY.labels(operation, 'read').time():
+            return func(conn)
+
+    # --- Напоминания ---
+
+    def _lease_until(self, reminder_ts):
+        return reminder_ts + self.lease_grace
+
+    def owns_chat(self, chat_id):
+        """
+        Возвращает True, если чат относится к части чатов этого процесса.
+        """
+        return abs(chat_id) % self.worker_count == self.worker_index
+
+    def claims(self, chat_id, reminder_ts, claim_until):
+        """
+        Возвращает True, если новое напоминание арендуется процессом, который его добавляет: чат из его части
+        или время напоминания не позже claim_until. Второе условие — для напоминаний, которые наступят раньше,
+        чем процесс-владелец чата успеет найти их очередным claim_due.
+        """
+        return self.owns_chat(chat_id) or reminder_ts <= claim_until
+
+    def _lease(self, chat_id, reminder_ts, claim_until):
+        if self.claims(chat_id, reminder_ts, claim_until):
+            return self.worker_id, self._lease_until(reminder_ts)
+        return None, None
+
+    async def add_reminder(self, chat_id, reminder_time, reminder_message, rule=None, claim_until=0):
+        """
+        Добавляет напоминание и возвращает его идентификатор. Напоминание арендуется текущим процессом,
+        если claims(chat_id, время, claim_until), иначе записывается без аренды.
+
+        reminder_time — datetime с часовым поясом. В reminder_ts записывается время в секундах UTC,
+        по которому работают все выборки; reminder_time сохраняется для наглядности в часовом поясе чата.
+
+        Для повторяющегося напоминания rule — выражение cron; правило записывается в таблицу recurrences,
+        а строка напоминания хранит только ближайшее срабатывание (см. advance_recurring).
+        """
+        reminder_ts = int(reminder_time.timestamp())
+
+        def insert(conn):
+            recurrence_id = None
+            if rule is not None:
+                recurrence_id = conn.execute('INSERT INTO recurrences (chat_id, rule) VALUES (?, ?)',
+                                             (chat_id, rule)).lastrowid
+            return conn.execute('''
+            INSERT INTO reminders (chat_id, reminder_time, reminder_ts, reminder_message, claimed_by, lease_until,
+                                   recurrence_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (chat_id, reminder_time.isoformat(timespec='seconds'), reminder_ts, reminder_message,
+                  *self._lease(chat_id, reminder_ts, claim_until), recurrence_id)).lastrowid
+
+        return await self._write('add_reminder', insert)
+
+    async def add_reminders(self, chat_id, reminders, schedule_until, claim_until=0):
+        """
+        Добавляет пачку напоминаний (время с часовым поясом, текст, правило или None) одной транзакцией;
+        аренда — как в add_reminder.
+
+        Правила повторения вставляются по одному (нужен их id), сами напоминания — одним executemany.
+        Возвращает (id, reminder_ts, reminder_message, правило) арендованных напоминаний со временем не позже
+        schedule_until — их нужно сразу передать планировщику.
+        """
+        def insert(conn):
+            first_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM reminders').fetchone()[0] + 1
+            params = []
+            for reminder_time, reminder_message, rule in reminders:
+                recurrence_id = None
+                if rule is not None:
+                    recurrence_id = conn.execute('INSERT INTO recurrences (chat_id, rule) VALUES (?, ?)',
+                                                 (chat_id, rule)).lastrowid
+                reminder_ts = int(reminder_time.timestamp())
+                params.append((chat_id, reminder_time.isoformat(timespec='seconds'), reminder_ts, reminder_message,
+                               *self._lease(chat_id, reminder_ts, claim_until), recurrence_id))
+            conn.executemany('''
+            INSERT INTO reminders (chat_id, reminder_time, reminder_ts, reminder_message, claimed_by, lease_until,
+                                   recurrence_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', params)
+            # Транзакция записи монопольна, поэтому все строки с id не меньше first_id — только что вставленные
+            return conn.execute('''
+            SELECT r.id, r.reminder_ts, r.reminder_message, c.rule
+            FROM reminders r
+            LEFT JOIN recurrences c ON c.id = r.recurrence_id
+            WHERE r.id >= ? AND r.reminder_ts <= ? AND r.claimed_by IS ?
+            ''', (first_id, schedule_until, self.worker_id)).fetchall()
+
+        return await self._write('add_reminders', insert)
+
+    async def delete_reminder(self, chat_id, reminder_id):
+        """
+        Удаляет напоминание чата chat_id вместе с его правилом повторения и возвращает True, если оно было.
+        Напоминание другого чата не удаляется, даже если его id подставлен в callback_data вручную.
+        """
+        def delete(conn):
+            conn.execute('''
+            DELETE FROM recurrences
+            WHERE id = (SELECT recurrence_id FROM reminders WHERE id = ? AND chat_id = ?)
+            ''', (reminder_id, chat_id))
+            return conn.execute('DELETE FROM reminders WHERE id = ? AND chat_id = ?',
+                                (reminder_id, chat_id)).rowcount == 1
+
+        return await self._write('delete_reminder', delete)
+
+    async def claim_for_sending(self, reminder_id):
+        """
+        Атомарно отмечает напоминание как отправленное перед отправкой.
+
+        Возвращает True, если напоминание ещё не было отправлено, не удалено и не перешло к другому
+        процессу. Отметка фиксируется до отправки сообщения, поэтому ни после перезапуска, ни при работе
+        нескольких процессов напоминание не будет отправлено повторно.
+        """
+        return await self._write('claim_for_sending', lambda conn: conn.execute('''
+        UPDATE reminders
+        SET is_sent = 1
+        WHERE id = ? AND is_sent = 0 AND (claimed_by IS NULL OR claimed_by = ?)
+        ''', (reminder_id, self.worker_id)).rowcount == 1)
+
+    async def advance_recurring(self, reminder_id, reminder_ts, next_time):
+        """
+        Атомарно забирает срабатывание reminder_ts повторяющегося напоминания для отправки и переносит
+        напоминание на следующее срабатывание next_time.
+
+        Аналог claim_for_sending для повторяющихся напоминаний: строка не отмечается отправленной,
+        а переходит к следующему времени, поэтому одно правило занимает одну строку. Возвращает True,
+        если срабатывание ещё не было забрано этим или другим процессом.
+        """
+        next_ts = int(next_time.timestamp())
+        return await self._write('advance_recurring', lambda conn: conn.execute('''
+        UPDATE reminders
+        SET reminder_ts = ?, reminder_time = ?, lease_until = ?
+        WHERE id = ? AND reminder_ts = ? AND is_sent = 0 AND (claimed_by IS NULL OR claimed_by = ?)
+        ''', (next_ts, next_time.isoformat(timespec='seconds'), self._lease_until(next_ts), reminder_id, reminder_ts,
+              self.worker_id)).rowcount == 1)
+
+    def snooze(self, chat_id, reminder_id, snooze_ts):
+        """
+        Откладывает повторную отправку напоминания чата chat_id до snooze_ts (None — отменяет отложенную
+        отправку); напоминания других чатов не затрагиваются.
+
+        Не ждёт записи: отметка попадает в буфер, который поток-писатель сбрасывает одним executemany
+        в ближайшей групповой транзакции. Повторные откладывания одного напоминания до сброса буфера
+        схлопываются в одну запись, поэтому всплеск нажатий не порождает поток отдельных записей.
+        """
+        with self._snooze_lock:
+            self._snoozes[reminder_id] = (chat_id, snooze_ts)
+            if self._snooze_flush_queued:
+                return
+            self._snooze_flush_queued = True
+        future = self._loop.create_future()
+        future.add_done_callback(_log_write_error)
+        self._write_queue.put((self._flush_snoozes, future, 'snooze'))
+
+    def _flush_snoozes(self, conn):
+        with self._snooze_lock:
+            snoozes, self._snoozes = self._snoozes, {}
+            self._snooze_flush_queued = False
+        conn.executemany('''
+        UPDATE reminders
+        SET snooze_ts = ?, snoozed_by = ?
+        WHERE id = ? AND chat_id = ?
+        ''', [(snooze_ts, self.worker_id, reminder_id, chat_id)
+              for reminder_id, (chat_id, snooze_ts) in snoozes.items()])
+
+    async def claim_snooze(self, reminder_id, snooze_ts):
+        """
+        Атомарно забирает отложенную отправку для отправки. Возвращает False, если её отменили,
+        перенесли или уже отправил другой процесс.
+        """
+        return await self._write('claim_snooze', lambda conn: conn.execute('''
+        UPDATE reminders
+        SET snooze_ts = NULL
+        WHERE id = ? AND snooze_ts = ? AND snoozed_by = ?
+        ''', (reminder_id, snooze_ts, self.worker_id)).rowcount == 1)
+
+    async def claim_snoozes(self, after, until):
+        """
+        Возвращает отложенные отправки (id, chat_id, snooze_ts, reminder_message) этого процесса
+        со временем в (after, until] и забирает отложенные отправки других процессов, просроченные
+        больше чем на lease_grace секунд.
+        """
+        def claim(conn):
+            rows = conn.execute('''
+            SELECT id, chat_id, snooze_ts, reminder_message
+            FROM reminders
+            WHERE snooze_ts IS NOT NULL
+              AND ((snooze_ts > ? AND snooze_ts <= ? AND snoozed_by = ?) OR snooze_ts < ?)
+            ''', (after, until, self.worker_id, time.time() - self.lease_grace)).fetchall()
+            conn.executemany('UPDATE reminders SET snoozed_by = ? WHERE id = ?',
+                             [(self.worker_id, row[0]) for row in rows])
+            return rows
+
+        return await self._write('claim_snoozes', claim)
+
+    async def mark_unsent(self, reminder_ids, not_before):
+        """
+        Снимает отметку об отправке с напоминаний, которые так и не удалось доставить, чтобы claim_overdue
+        вернул их для повторной отправки. Напоминания со временем раньше not_before остаются отправленными:
+        доставка прекращается. Возвращает число напоминаний, поставленных на повтор.
+        """
+        return await self._write('mark_unsent', lambda conn: conn.executemany('''
+        UPDATE reminders
+        SET is_sent = 0
+        WHERE id = ? AND is_sent = 1 AND reminder_ts >= ?
+        ''', [(reminder_id, not_before) for reminder_id in reminder_ids]).rowcount)
+
+    async def restore_snoozes(self, snoozes, not_before):
+        """
+        Возвращает недоставленные отложенные отправки (id, snooze_ts) в базу, чтобы claim_snoozes забрал
+        их повторно после lease_grace секунд; отметка об отправке самого напоминания не меняется.
+        Отправки со временем раньше not_before и отложенные пользователем заново не восстанавливаются.
+        Возвращает число восстановленных отправок.
+        """
+        return await self._write('restore_snoozes', lambda conn: conn.executemany('''
+        UPDATE reminders
+        SET snooze_ts = ?, snoozed_by = ?
+        WHERE id = ? AND snooze_ts IS NULL
+        ''', [(snooze_ts, self.worker_id, reminder_id)
+              for reminder_id, snooze_ts in snoozes if snooze_ts >= not_before]).rowcount)
+
+    async def reminders_page(self, chat_id, after, cursor=None, backward=False, limit=10, pending=False):
+        """
+        Возвращает страницу напоминаний пользователя со временем позже after (в секундах UTC),
+        упорядоченных по (reminder_ts, id), и признак того, что в направлении чтения есть ещё строки.
+        Строка — (id, reminder_ts, reminder_message, is_sent, правило повторения или None).
+
+        cursor — (reminder_ts, id) крайнего напоминания соседней страницы: при backward=False читаются
+        строки после него, иначе — перед ним. Выборка идёт по индексу и ограничена limit + 1 строками,
+        поэтому её стоимость не зависит от размера истории пользователя.
+        """
+        conditions = ['r.chat_id = ?', 'r.reminder_ts > ?']
+        params = [chat_id, after]
+        if pending:
+            conditions.append('r.is_sent = 0')
+        if cursor is not None:
+            conditions.append(f"(r.reminder_ts, r.id) {'<' if backward else '>'} (?, ?)")
+            params.extend(cursor)
+        order = 'DESC' if backward else 'ASC'
+        query = f'''
+        SELECT r.id, r.reminder_ts, r.reminder_message, r.is_sent, c.rule
+        FROM reminders r
+        LEFT JOIN recurrences c ON c.id = r.recurrence_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY r.reminder_ts {order}, r.id {order}
+        LIMIT ?
+        '''
+        rows = await self._read('reminders_page', lambda conn: conn.execute(query, (*params, limit + 1)).fetchall())
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+        return rows, has_more
+
+    async def last_past_reminder(self, chat_id, before):
+        """
+        Возвращает (reminder_ts, reminder_message) последнего напоминания не позже before или None.
+        """
+        return await self._read('last_past_reminder', lambda conn: conn.execute('''
+        SELECT reminder_ts, reminder_message
+        FROM reminders
+        WHERE chat_id = ? AND reminder_ts <= ?
+        ORDER BY reminder_ts DESC
+        LIMIT 1
+        ''', (chat_id, before)).fetchone())
+
+    async def recent_messages(self, chat_id, limit=5):
+        """
+        Возвращает последние различные тексты напоминаний пользователя.
+
+        Строки читаются по индексу (chat_id, reminder_ts DESC, reminder_message) от новых к старым
+        без сортировки и обращения к таблице; чтение прекращается, как только набрано limit текстов.
+        """
+        def select(conn):
+            messages = []
+            for (message,) in conn.execute('''
+            SELECT reminder_message
+            FROM reminders
+            WHERE chat_id = ?
+            ORDER BY reminder_ts DESC
+            ''', (chat_id,)):
+                if message not in messages:
+                    messages.append(message)
+                    if len(messages) == limit:
+                        break
+            return messages
+
+        return await self._read('recent_messages', select)
+
+    async def search_reminders(self, chat_id, text, offset=0, limit=10):
+        """
+        Ищет напоминания пользователя по словам text; последнее слово может быть началом слова.
+
+        Возвращает страницу строк (id, reminder_ts, reminder_message, is_sent, правило повторения или None)
+        и признак того, что есть следующая страница. Сначала идут тексты, в которых слова запроса составляют
+        большую долю слов, при равенстве — более поздние. Встроенная bm25 не используется: для веса слов она
+        читает списки строк с этими словами во всей таблице, а не только в чате. Вместо неё порядок и страницу
+        выбирает сам запрос (ORDER BY ... LIMIT ... OFFSET) по функции search_relevance, зарегистрированной
+        в каждом соединении (см. _relevance), поэтому SQLite держит в сортировке только offset + limit строк.
+        """
+        expression, words = _search_query(chat_id, text)
+        if expression is None:
+            return [], False
+
+        # CROSS JOIN закрепляет порядок соединения: сначала индекс FTS5, затем строки reminders по rowid
+        rows = await self._read('search_reminders', lambda conn: conn.execute('''
+        SELECT id, reminder_ts, reminder_message, is_sent, rule
+        FROM (
+            SELECT r.id, r.reminder_ts, r.reminder_message, r.is_sent, c.rule,
+                   search_relevance(r.reminder_message, ?) AS relevance
+            FROM reminders_fts
+            CROSS JOIN reminders r ON r.id = reminders_fts.rowid
+            LEFT JOIN recurrences c ON c.id = r.recurrence_id
+            WHERE reminders_fts MATCH ? AND r.chat_id = ?
+        )
+        WHERE relevance > 0
+        ORDER BY relevance DESC, reminder_ts DESC
+        LIMIT ? OFFSET ?
+        ''', (' '.join(words), expression, chat_id, limit + 1, offset)).fetchall())
+        return rows[:limit], len(rows) > limit
+
+    async def complete_messages(self, chat_id, text, limit=5):
+        """
+        Возвращает последние различные тексты напоминаний пользователя, содержащие слова text;
+        последнее слово ищется как начало слова.
+        """
+        expression, words = _search_query(chat_id, text)
+        if expression is None:
+            return []
+
+        def select(conn):
+            messages = []
+            for (message,) in conn.execute('''
+            SELECT r.reminder_message
+            FROM reminders_fts
+            CROSS JOIN reminders r ON r.id = reminders_fts.rowid
+            WHERE reminders_fts MATCH ? AND r.chat_id = ?
+            ORDER BY r.reminder_ts DESC
+            ''', (expression, chat_id)):
+                if message not in messages and _relevance(message, words):
+                    messages.append(message)
+                    if len(messages) == limit:
+                        break
+            return messages
+
+        return await self._read('complete_messages', select)
+
+    async def export_reminders(self, chat_id, write):
+        """
+        Вызывает write(row) для каждого напоминания пользователя, от ранних к поздним, в читающем потоке.
+        Строка — (reminder_ts, reminder_message, is_sent, правило повторения или None).
+
+        Строки читаются курсором по одной и не накапливаются в памяти, поэтому write должна сама
+        сразу записывать их, например, в файл.
+        """
+        def export(conn):
+            count = 0
+            for row in conn.execute('''
+            SELECT r.reminder_ts, r.reminder_message, r.is_sent, c.rule
+            FROM reminders r
+            LEFT JOIN recurrences c ON c.id = r.recurrence_id
+            WHERE r.chat_id = ?
+            ORDER BY r.reminder_ts, r.id
+            ''', (chat_id,)):
+                write(row)
+                count += 1
+            return count
+
+        return await self._read('export_reminders', export)
+
+    async def claim_due(self, after, until):
+        """
+        Арендует для текущего процесса и возвращает неотправленные напоминания
+        (id, chat_id, reminder_ts, reminder_message, правило повторения или None) со временем в полуинтервале
+        (after, until] (в секундах UTC), арендованные этим процессом, а также ещё никем не арендованные
+        напоминания его части чатов со временем от текущего момента до until: их мог добавить другой процесс
+        уже после того, как это окно было загружено. Просроченные напоминания забирает claim_overdue.
+
+        Выборка и аренда выполняются в одной транзакции записи, поэтому два процесса не могут арендовать
+        одно и то же напоминание.
+        """
+        def claim(conn):
+            rows = conn.execute('''
+            SELECT r.id, r.chat_id, r.reminder_ts, r.reminder_message, c.rule
+            FROM reminders r
+            LEFT JOIN recurrences c ON c.id = r.recurrence_id
+            WHERE r.is_sent = 0 AND r.reminder_ts > ? AND r.reminder_ts <= ? AND r.claimed_by = ?
+            ''', (after, until, self.worker_id)).fetchall()
+            # Частичный индекс idx_reminders_unclaimed содержит только строки без аренды
+            rows += conn.execute('''
+            SELECT r.id, r.chat_id, r.reminder_ts, r.reminder_message, c.rule
+            FROM reminders r
+            LEFT JOIN recurrences c ON c.id = r.recurrence_id
+            WHERE r.claimed_by IS NULL AND r.is_sent = 0 AND r.reminder_ts > ? AND r.reminder_ts <= ?
+              AND abs(r.chat_id) % ? = ?
+            ''', (min(after, int(time.time())), until, self.worker_count, self.worker_index)).fetchall()
+            conn.executemany('''
+            UPDATE reminders
+            SET claimed_by = ?, lease_until = ?
+            WHERE id = ?
+            ''', [(self.worker_id, self._lease_until(reminder_ts), reminder_id)
+                  for reminder_id, _, reminder_ts, _, _ in rows])
+            return rows
+
+        return await self._write('claim_due', claim)
+
+    async def claim_overdue(self, before, limit):
+        """
+        Арендует и возвращает не больше limit самых старых неотправленных напоминаний со временем не позже
+        before (в том же виде, что claim_due): арендованные этим процессом, никем не арендованные из его части
+        чатов и любые напоминания с истёкшей арендой (их процесс, по-видимому, упал).
+
+        Аренда продлевается на lease_grace секунд от текущего момента, чтобы другие процессы не забрали
+        напоминание, пока этот процесс его отправляет.
+        """
+        def claim(conn):
+            now = time.time()
+            rows = conn.execute('''
+            SELECT r.id, r.chat_id, r.reminder_ts, r.reminder_message, c.rule
+            FROM reminders r
+            LEFT JOIN recurrences c ON c.id = r.recurrence_id
+            WHERE r.is_sent = 0 AND r.reminder_ts <= ?
+              AND (r.claimed_by = ? OR (r.claimed_by IS NULL AND abs(r.chat_id) % ? = ?) OR r.lease_until < ?)
+            ORDER BY r.reminder_ts
+            LIMIT ?
+            ''', (before, self.worker_id, self.worker_count, self.worker_index, now, limit)).fetchall()
+            conn.executemany('''
+            UPDATE reminders
+            SET claimed_by = ?, lease_until = ?
+            WHERE id = ?
+            ''', [(self.worker_id, now + self.lease_grace, row[0]) for row in rows])
+            return rows
+
+        return await self._write('claim_overdue', claim)
+
+    async def claim_many_for_sending(self, reminder_ids):
+        """
+        Отмечает пачку напоминаний отправленными (как claim_for_sending) одним запросом и возвращает
+        идентификаторы тех, что удалось забрать.
+        """
+        def claim(conn):
+            placeholders = ','.join('?' * len(reminder_ids))
+            return [row[0] for row in conn.execute(f'''
+            UPDATE reminders
+            SET is_sent = 1
+            WHERE id IN ({placeholders}) AND is_sent = 0 AND (claimed_by IS NULL OR claimed_by = ?)
+            RETURNING id
+            ''', (*reminder_ids, self.worker_id)).fetchall()]
+
+        return await self._write('claim_many_for_sending', claim)
+
+    # --- Архив ---
+
+    async def archive_sent(self, before, limit):
+        """
+        Переносит до limit отправленных однократных напоминаний со временем раньше before в таблицу
+        reminders_archive и возвращает число перенесённых строк.
+
+        Одна пачка — одно задание потока-писателя, поэтому блокировка записи удерживается только на время
+        переноса limit строк. Отложенные напоминания (в том числе ещё не записанные в базу) не переносятся.
+        """
+        def archive(conn):
+            with self._snooze_lock:
+                pending = set(self._snoozes)
+            ids = [row[0] for row in conn.execute('''
+            SELECT id FROM reminders
+            WHERE is_sent = 1 AND reminder_ts < ? AND recurrence_id IS NULL AND snooze_ts IS NULL
+            ORDER BY reminder_ts LIMIT ?
+            ''', (before, limit)) if row[0] not in pending]
+            if not ids:
+                return 0
+            placeholders = ','.join('?' * len(ids))
+            conn.execute(f'''
+            INSERT OR IGNORE INTO reminders_archive (id, chat_id, reminder_ts, reminder_message, archived_at)
+            SELECT id, chat_id, reminder_ts, reminder_message, ? FROM reminders WHERE id IN ({placeholders})
+            ''', (int(time.time()), *ids))
+            conn.execute(f'DELETE FROM reminders WHERE id IN ({placeholders})', ids)
+            return len(ids)
+
+        return await self._write('archive_sent', archive)
+
+    async def incremental_vacuum(self, pages):
+        """
+        Возвращает системе до pages свободных страниц файла базы. Возвращает число оставшихся свободных
+        страниц или None, если база создана без auto_vacuum=INCREMENTAL.
+        """
+        def vacuum(conn):
+            if conn.execute('PRAGMA auto_vacuum;').fetchone()[0] != 2:
+                return None
+            # Модуль sqlite3 выполняет прагму без результата за один шаг, а каждый шаг освобождает одну страницу
+            for _ in range(min(pages, conn.execute('PRAGMA freelist_count;').fetchone()[0])):
+                conn.execute('PRAGMA incremental_vacuum;')
+            return conn.execute('PRAGMA freelist_count;').fetchone()[0]
+
+        return await self._write('incremental_vacuum', vacuum)
+
+    async def database_size(self):
+        """
+        Возвращает размер файла базы и объём свободных страниц в нём (в байтах).
+        """
+        def size(conn):
+            page_size = conn.execute('PRAGMA page_size;').fetchone()[0]
+            page_count = conn.execute('PRAGMA page_count;').fetchone()[0]
+            free_count = conn.execute('PRAGMA freelist_count;').fetchone()[0]
+            return page_count * page_size, free_count * page_size
+
+        return await self._read('database_size', size)
+
+    async def count_reminders(self):
+        """
+        Возвращает число строк в рабочей таблице напоминаний (без архива).
+        """
+        row = await self._read('count_reminders',
+                               lambda conn: conn.execute('SELECT count(*) FROM reminders').fetchone())
+        return row[0]
+
+    # --- Чаты ---
+
+    async def chat_timezone(self, chat_id):
+        """
+        Возвращает название часового пояса чата или None, если он не задан.
+        """
+        row = await self._read('chat_timezone', lambda conn: conn.execute(
+            'SELECT timezone FROM chats WHERE chat_id = ?', (chat_id,)).fetchone())
+        return row[0] if row else None
+
+    async def set_chat_timezone(self, chat_id, timezone):
+        await self._write('set_chat_timezone', lambda conn: conn.execute('''
+        INSERT INTO chats (chat_id, timezone) VALUES (?, ?)
+        ON CONFLICT (chat_id) DO UPDATE SET timezone = excluded.timezone
+        ''', (chat_id, timezone)))
+
+
+def _log_write_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logging.error("Ошибка фоновой записи в базу: %s", future.exception())
+
+
+def _resolve(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _columns(conn, table):
+    return [column[1] for column in conn.execute(f'PRAGMA table_info({table});').fetchall()]
+
+
+def _migration_step(migration, version, state, conn):
+    done = migration(conn, state)
+    if done:
+        conn.execute(f'PRAGMA user_version = {version};')
+    return done
+
+
+def _search_words(text):
+    """
+    Слова text, как их разделяет токенизатор unicode61, в нижнем регистре.
+    """
+    return re.findall(r'[^\W_]+', text.lower())
+
+
+@lru_cache(maxsize=10000)
+def _fold(word):
+    """
+    Слово без диакритических знаков — для сравнения слов в Python (см. _relevance).
+    """
+    return ''.join(ch for ch in unicodedata.normalize('NFKD', word) if not unicodedata.combining(ch))
+
+
+def _search_query(chat_id, text):
+    """
+    Строит запрос FTS5: все слова text среди напоминаний чата chat_id, последнее — как начало слова.
+
+    Возвращает выражение MATCH и слова запроса без диакритики для _relevance или (None, []), если в text
+    нет слов. Номер чата проиндексирован как слово (без знака минус), поэтому условие на чат выбирает
+    из индекса только строки этого чата; слова заключаются в кавычки, так что синтаксис FTS5 в тексте
+    пользователя не интерпретируется.
+
+    Начало слова длиннее SEARCH_PREFIX_LENGTH символов FTS5 искал бы слиянием списков всех подходящих слов
+    индекса, то есть за время, растущее с размером всей таблицы. Поэтому оно ищется по первым
+    SEARCH_PREFIX_LENGTH символам через индекс префиксов, а лишние строки отбрасывает _relevance.
+    """
+    words = _search_words(text)
+    if not words:
+        return None, []
+    *exact, last = words
+    terms = ' '.join(f'"{word}"' for word in (*exact, last[:SEARCH_PREFIX_LENGTH]))
+    return f'chat_id : "{abs(chat_id)}" AND reminder_message : ({terms}*)', [_fold(word) for word in words]
+
+
+def _relevance(message, words):
+    """
+    Доля слов message, совпадающих со словами запроса words (последнее — начало слова), или 0, если
+    последнее слово запроса не начинает ни одного слова message и строка не подходит.
+    """
+    *exact, prefix = words
+    tokens = [_fold(token) for token in _search_words(message)]
+    hits = sum(token in exact or token.startswith(prefix) for token in tokens)
+    if not any(token.startswith(prefix) for token in tokens):
+        return 0
+    return hits / len(tokens)
+
+
+def _search_relevance(message, words):
+    """
+    SQL-функция search_relevance: _relevance для слов запроса, переданных одной строкой через пробел.
+    """
+    return _relevance(message, words.split())
+
+
+def _init_schema(conn, state):
+    """
+    Исходная схема: таблица напоминаний, колонки отправки и аренды, индексы.
+
+    Применяется и к базам, созданным до появления версий схемы, поэтому проверяет наличие колонок.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS reminders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER,
+        reminder_time TEXT,
+        reminder_message TEXT,
+        is_sent INTEGER DEFAULT 0
+    )
+    ''')
+
+    # Добавление колонки is_sent, если она не существует
+    column_names = _columns(conn, 'reminders')
+    if 'is_sent' not in column_names:
+        conn.execute('ALTER TABLE reminders ADD COLUMN is_sent INTEGER DEFAULT 0;')
+
+    # Колонки аренды напоминаний процессами бота
+    if 'claimed_by' not in column_names:
+        conn.execute('ALTER TABLE reminders ADD COLUMN claimed_by TEXT;')
+    if 'lease_until' not in column_names:
+        conn.execute('ALTER TABLE reminders ADD COLUMN lease_until REAL;')
+
+    # Индекс для поиска напоминаний с истёкшей арендой
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reminders_is_sent_lease ON reminders (is_sent, lease_until);')
+    return True
+
+
+def _migrate_epoch(conn, state):
+    """
+    Время напоминаний в секундах UTC (колонка reminder_ts) вместо ISO-строки местного времени.
+
+    Старые строки reminder_time записаны в местном времени процесса бота (TZ контейнера) и переводятся
+    в UTC средствами SQLite пачками по MIGRATION_BATCH_SIZE строк, по диапазонам id.
+    """
+    if 'last_id' not in state:
+        if 'reminder_ts' not in _columns(conn, 'reminders'):
+            conn.execute('ALTER TABLE reminders ADD COLUMN reminder_ts INTEGER;')
+        state['last_id'] = 0
+        state['max_id'] = conn.execute('SELECT coalesce(max(id), 0) FROM reminders;').fetchone()[0]
+
+    if state['last_id'] < state['max_id']:
+        upper = state['last_id'] + MIGRATION_BATCH_SIZE
+        conn.execute('''
+        UPDATE reminders
+        SET reminder_ts = CAST(strftime('%s', reminder_time, 'utc') AS INTEGER)
+        WHERE id > ? AND id <= ? AND reminder_ts IS NULL
+        ''', (state['last_id'], upper))
+        state['last_id'] = upper
+        return False
+
+    for name in ('idx_reminders_is_sent_time', 'idx_reminders_chat_time', 'idx_reminders_chat_sent_time'):
+        conn.execute(f'DROP INDEX IF EXISTS {name};')
+
+    # Индекс для выборки неотправленных напоминаний в окне времени
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reminders_is_sent_ts ON reminders (is_sent, reminder_ts);')
+
+    # Покрывающий индекс для последних текстов напоминаний пользователя
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reminders_chat_ts '
+                 'ON reminders (chat_id, reminder_ts DESC, reminder_message);')
+
+    # Индекс для постраничного вывода неотправленных напоминаний пользователя
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reminders_chat_sent_ts ON reminders (chat_id, is_sent, reminder_ts);')
+    return True
+
+
+def _create_chats(conn, state):
+    """
+    Таблица настроек чатов (часовой пояс).
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS chats (
+        chat_id INTEGER PRIMARY KEY,
+        timezone TEXT
+    )
+    ''')
+    return True
+
+
+def _create_recurrences(conn, state):
+    """
+    Таблица правил повторяющихся напоминаний.
+
+    У повторяющегося напоминания одна строка в reminders со ссылкой recurrence_id на правило;
+    после каждого срабатывания она переносится на следующее время.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS recurrences (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER,
+        rule TEXT
+    )
+    ''')
+    if 'recurrence_id' not in _columns(conn, 'reminders'):
+        conn.execute('ALTER TABLE reminders ADD COLUMN recurrence_id INTEGER;')
+    return True
+
+
+def _add_snooze(conn, state):
+    """
+    Колонки отложенной повторной отправки напоминания (кнопки «Отложить»).
+    """
+    column_names = _columns(conn, 'reminders')
+    if 'snooze_ts' not in column_names:
+        conn.execute('ALTER TABLE reminders ADD COLUMN snooze_ts INTEGER;')
+    if 'snoozed_by' not in column_names:
+        conn.execute('ALTER TABLE reminders ADD COLUMN snoozed_by TEXT;')
+
+    # Частичный индекс: отложенных напоминаний мало по сравнению со всей таблицей
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reminders_snooze ON reminders (snooze_ts) '
+                 'WHERE snooze_ts IS NOT NULL;')
+    return True
+
+
+def _create_archive(conn, state):
+    """
+    Архив отправленных напоминаний, вынесенных из рабочей таблицы.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS reminders_archive (
+        id INTEGER PRIMARY KEY,
+        chat_id INTEGER,
+        reminder_ts INTEGER,
+        reminder_message TEXT,
+        archived_at INTEGER
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reminders_archive_chat_ts ON reminders_archive (chat_id, reminder_ts);')
+    return True
+
+
+def _create_search(conn, state):
+    """
+    Полнотекстовый индекс FTS5 по текстам напоминаний для /find и подсказок в мастере /set.
+
+    Индекс внешнего содержимого (content='reminders') хранит только слова, а сами тексты читаются из reminders.
+    Существующие строки добавляются пачками по MIGRATION_BATCH_SIZE строк, по диапазонам id; в последнем шаге
+    создаются триггеры, которые дальше обновляют индекс при каждой вставке, удалении и изменении строки.
+    """
+    if 'last_id' not in state:
+        # Индекс, частично заполненный прерванной миграцией, строится заново
+        conn.execute('DROP TABLE IF EXISTS reminders_fts;')
+        conn.execute('''
+        CREATE VIRTUAL TABLE reminders_fts USING fts5(
+            chat_id, reminder_message,
+            content='reminders', content_rowid='id', prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+        )
+        ''')
+        state['last_id'] = 0
+        state['max_id'] = conn.execute('SELECT coalesce(max(id), 0) FROM reminders;').fetchone()[0]
+
+    fill = '''
+    INSERT INTO reminders_fts (rowid, chat_id, reminder_message)
+    SELECT id, chat_id, reminder_message FROM reminders WHERE id > ? AND id <= ?
+    '''
+    if state['last_id'] < state['max_id']:
+        upper = state['last_id'] + MIGRATION_BATCH_SIZE
+        conn.execute(fill, (state['last_id'], upper))
+        state['last_id'] = upper
+        return False
+
+    # Строки, добавленные во время заполнения (id растут, AUTOINCREMENT не использует их повторно)
+    conn.execute(fill, (state['max_id'], 2 ** 63 - 1))
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS reminders_fts_insert AFTER INSERT ON reminders BEGIN
+        INSERT INTO reminders_fts (rowid, chat_id, reminder_message) VALUES (new.id, new.chat_id, new.reminder_message);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS reminders_fts_delete AFTER DELETE ON reminders BEGIN
+        INSERT INTO reminders_fts (reminders_fts, rowid, chat_id, reminder_message)
+        VALUES ('delete', old.id, old.chat_id, old.reminder_message);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS reminders_fts_update AFTER UPDATE OF chat_id, reminder_message ON reminders BEGIN
+        INSERT INTO reminders_fts (reminders_fts, rowid, chat_id, reminder_message)
+        VALUES ('delete', old.id, old.chat_id, old.reminder_message);
+        INSERT INTO reminders_fts (rowid, chat_id, reminder_message) VALUES (new.id, new.chat_id, new.reminder_message);
+    END
+    ''')
+    return True
+
+
+def _index_unclaimed(conn, state):
+    """
+    Частичный индекс неотправленных напоминаний без аренды для claim_due.
+
+    Такие напоминания добавляет процесс, принявший обновление, для чата из части другого процесса; их мало
+    по сравнению со всей таблицей, поэтому поиск по индексу не зависит от числа арендованных строк.
+    """
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reminders_unclaimed ON reminders (reminder_ts) '
+                 'WHERE claimed_by IS NULL AND is_sent = 0;')
+    return True
+
+
+# Миграции схемы по порядку: функция migration(conn, state) возвращает True, когда миграция завершена
+MIGRATIONS = [_init_schema, _migrate_epoch, _create_chats, _create_recurrences, _add_snooze,
+              _create_archive, _create_search, _index_unclaimed]
@@ -0,0 +1,177 @@
+"""
+Тесты хранилища PostgreSQL (pg_storage.py): разделение чатов между процессами, аренда напоминаний
+несколькими пулами соединений одновременно (FOR UPDATE SKIP LOCKED) и поиск по словам.
+
+Нужен работающий PostgreSQL: тесты пропускаются, если не задана переменная POSTGRES_DSN. Каждый тест
+создаёт свою схему и удаляет её после себя, таблицы в базе по DSN не затрагиваются.
+
+Запуск из корня репозитория:
+    POSTGRES_DSN=postgresql://localhost/alarmbot_test python -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import time
+import unittest
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+POSTGRES_DSN = os.getenv('POSTGRES_DSN')
+
+if POSTGRES_DSN:
+    import asyncpg
+
+    from pg_storage import PostgresReminderStore
+
+
+def at(ts):
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+def with_search_path(dsn, schema):
+    # Неизвестные asyncpg параметры DSN передаются серверу как настройки соединения
+    parts = urlsplit(dsn)
+    query = urlencode([*parse_qsl(parts.query), ('search_path', schema)])
+    return urlunsplit(parts._replace(query=query))
+
+
+@unittest.skipUnless(POSTGRES_DSN, 'POSTGRES_DSN не задан')
+class PostgresTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.schema = f'alarmbot_test_{uuid.uuid4().hex[:12]}'
+        conn = await asyncpg.connect(POSTGRES_DSN)
+        try:
+            await conn.execute(f'CREATE SCHEMA {self.schema}')
+        finally:
+            await conn.close()
+        self.dsn = with_search_path(POSTGRES_DSN, self.schema)
+        self.stores = []
+        self.now = int(time.time())
+
+    async def asyncTearDown(self):
+        for store in self.stores:
+            await store.close()
+        conn = await asyncpg.connect(POSTGRES_DSN)
+        try:
+            await conn.execute(f'DROP SCHEMA {self.schema} CASCADE')
+        finally:
+            await conn.close()
+
+    async def open_store(self, **kwargs):
+        store = PostgresReminderStore(self.dsn, min_size=1, max_size=4, **kwargs)
+        await store.open()
+        self.stores.append(store)
+        return store
+
+
+class PartitionTest(PostgresTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        # first принимает обновления и добавляет напоминания всех чатов, как процесс polling/webhook
+        self.first = await self.open_store(worker_id='worker-0', worker_index=0, worker_count=2)
+        self.second = await self.open_store(worker_id='worker-1', worker_index=1, worker_count=2)
+
+    async def add(self, chat_id, offset, claim_until=0):
+        return await self.first.add_reminder(chat_id, at(self.now + offset), f"чат {chat_id}",
+                                             claim_until=claim_until)
+
+    async def test_each_store_claims_only_its_chats(self):
+        ids = {chat_id: await self.add(chat_id, 60) for chat_id in (10, 11, -12, -13)}
+        first = await self.first.claim_due(self.now, self.now + 120)
+        second = await self.second.claim_due(self.now, self.now + 120)
+        self.assertEqual({row[0] for row in first}, {ids[10], ids[-12]})
+        self.assertEqual({row[0] for row in second}, {ids[11], ids[-13]})
+
+    async def test_row_added_after_window_was_loaded(self):
+        await self.second.claim_due(self.now, self.now + 120)
+        reminder_id = await self.add(11, 60)
+        rows = await self.second.claim_due(self.now + 120, self.now + 180)
+        self.assertEqual([row[0] for row in rows], [reminder_id])
+        self.assertEqual(await self.first.claim_due(self.now, self.now + 180), [])
+
+    async def test_add_reminders_returns_only_claimed_rows(self):
+        rows = [(at(self.now + 1), 'скоро', None), (at(self.now + 60), 'позже', None)]
+        added = await self.first.add_reminders(11, rows, self.now + 120, claim_until=self.now + 5)
+        self.assertEqual([row[2] for row in added], ['скоро'])
+        claimed = await self.second.claim_due(self.now, self.now + 120)
+        self.assertEqual([row[3] for row in claimed], ['позже'])
+
+
+class ConcurrentClaimTest(PostgresTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        # Оба процесса отвечают за все чаты: их запросы претендуют на одни и те же строки
+        self.stores_by_id = [await self.open_store(worker_id=f'worker-{index}') for index in range(2)]
+        self.seeder = await self.open_store()
+        self.count = 400
+
+    async def seed(self, first_offset):
+        rows = [(at(self.now + first_offset + i % 50), f"напоминание {i}", None) for i in range(self.count)]
+        await asyncio.gather(*(self.seeder.add_reminders(chat_id, rows[chat_id::8], 0) for chat_id in range(8)))
+
+    def assertDisjoint(self, results):
+        claimed = [{row[0] for row in rows} for rows in results]
+        self.assertFalse(claimed[0] & claimed[1])
+        self.assertEqual(len(claimed[0] | claimed[1]), self.count)
+
+    async def test_claim_due(self):
+        await self.seed(60)
+        for _ in range(3):
+            results = await asyncio.gather(*(store.claim_due(self.now, self.now + 120) for store in self.stores_by_id))
+            # Повторная аренда своих строк не отдаёт их другому процессу
+            self.assertDisjoint(results)
+
+    async def test_claim_overdue(self):
+        await self.seed(-100)
+        results = await asyncio.gather(*(store.claim_overdue(self.now, self.count) for store in self.stores_by_id))
+        self.assertDisjoint(results)
+
+    async def test_claim_many_for_sending(self):
+        await self.seed(60)
+        ids = [row[0] for row in await self.stores_by_id[0].claim_due(self.now, self.now + 120)]
+        # Строки арендованы worker-0: worker-1 не может отметить их отправленными
+        results = await asyncio.gather(*(store.claim_many_for_sending(ids) for store in self.stores_by_id))
+        self.assertEqual(sorted(results[0]), sorted(ids))
+        self.assertEqual(results[1], [])
+
+
+class SearchTest(PostgresTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.store = await self.open_store()
+        for offset, message in enumerate(['Позвонить маме', 'позвонить врачу насчёт анализов', 'Купить молоко',
+                                          'позвонить маме вечером']):
+            await self.store.add_reminder(1, at(self.now + offset), message)
+        await self.store.add_reminder(2, at(self.now), 'Позвонить маме')
+
+    async def search(self, text, offset=0, limit=10):
+        rows, has_more = await self.store.search_reminders(1, text, offset, limit)
+        return [row[2] for row in rows], has_more
+
+    async def test_all_words_last_as_prefix(self):
+        self.assertEqual(sorted((await self.search('позвонить мам'))[0]), ['Позвонить маме', 'позвонить маме вечером'])
+        self.assertEqual((await self.search('молок'))[0], ['Купить молоко'])
+        self.assertEqual(await self.search('такси'), ([], False))
+
+    async def test_other_chats_are_not_found(self):
+        rows, _ = await self.store.search_reminders(2, 'позвонить')
+        self.assertEqual([row[2] for row in rows], ['Позвонить маме'])
+
+    async def test_pages(self):
+        first, has_more = await self.search('позвонить', 0, 2)
+        self.assertEqual(len(first), 2)
+        self.assertTrue(has_more)
+        rest, has_more = await self.search('позвонить', 2, 2)
+        self.assertFalse(has_more)
+        self.assertEqual(sorted(first + rest),
+                         ['Позвонить маме', 'позвонить врачу насчёт анализов', 'позвонить маме вечером'])
+
+    async def test_no_words(self):
+        self.assertEqual(await self.store.search_reminders(1, '  ,!  '), ([], False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+"""
+Тесты разбора правил cron и поиска следующего срабатывания (recurrence.py).
+
+Запуск из корня репозитория:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recurrence import Rule, parse_command, parse_rule, weekly_rule  # noqa: E402
+
+UTC = timezone.utc
+BERLIN = ZoneInfo('Europe/Berlin')
+
+
+def at(*args, tz=UTC):
+    return datetime(*args, tzinfo=tz)
+
+
+class ParseRuleTest(unittest.TestCase):
+    def test_star_covers_whole_field(self):
+        rule = Rule('* * * * *')
+        self.assertEqual(rule.minutes, frozenset(range(60)))
+        self.assertEqual(rule.hours, frozenset(range(24)))
+        self.assertEqual(rule.days, frozenset(range(1, 32)))
+        self.assertEqual(rule.months, frozenset(range(1, 13)))
+        self.assertEqual(rule.weekdays, frozenset(range(7)))
+
+    def test_lists_ranges_and_steps(self):
+        rule = Rule('0,30 9-11 1-10/3 */4 *')
+        self.assertEqual(rule.minutes, {0, 30})
+        self.assertEqual(rule.hours, {9, 10, 11})
+        self.assertEqual(rule.days, {1, 4, 7, 10})
+        self.assertEqual(rule.months, {1, 5, 9})
+
+    def test_single_value_with_step_runs_to_field_end(self):
+        self.assertEqual(Rule('50/5 * * * *').minutes, {50, 55})
+
+    def test_weekdays_use_datetime_numbering(self):
+        # В cron 1-5 — понедельник–пятница, 0 и 7 — воскресенье
+        self.assertEqual(Rule('0 9 * * 1-5').weekdays, frozenset(range(5)))
+        self.assertEqual(Rule('0 9 * * 0').weekdays, {6})
+        self.assertEqual(Rule('0 9 * * 7').weekdays, {6})
+
+    def test_expression_is_normalized(self):
+        self.assertEqual(Rule('  0   9 * *  1-5 ').expression, '0 9 * * 1-5')
+
+    def test_invalid_expressions(self):
+        for expression in ('0 9 * *', '0 9 * * * *', '60 * * * *', '* 24 * * *', '* * 0 * *', '* * * 13 *',
+                           '* * * * 8', '5-1 * * * *', '*/0 * * * *', 'a * * * *', '1-2-3 * * * *', ''):
+            with self.subTest(expression=expression):
+                with self.assertRaises(ValueError):
+                    Rule(expression)
+
+    def test_parse_rule_is_cached(self):
+        self.assertIs(parse_rule('0 9 * * *'), parse_rule('0 9 * * *'))
+
+
+class NextAfterTest(unittest.TestCase):
+    def assertNext(self, expression, moment, expected):
+        self.assertEqual(Rule(expression).next_after(moment), expected)
+
+    def test_strictly_after_moment(self):
+        self.assertNext('0 9 * * *', at(2026, 5, 4, 9, 0), at(2026, 5, 5, 9, 0))
+        self.assertNext('0 9 * * *', at(2026, 5, 4, 8, 59, 59), at(2026, 5, 4, 9, 0))
+
+    def test_seconds_are_dropped(self):
+        self.assertNext('* * * * *', at(2026, 5, 4, 9, 0, 30, 500), at(2026, 5, 4, 9, 1))
+
+    def test_step_minutes(self):
+        self.assertNext('*/15 * * * *', at(2026, 5, 4, 9, 7), at(2026, 5, 4, 9, 15))
+        self.assertNext('*/15 * * * *', at(2026, 5, 4, 9, 45), at(2026, 5, 4, 10, 0))
+
+    def test_hour_range_rolls_to_next_day(self):
+        self.assertNext('30 9-17 * * *', at(2026, 5, 4, 17, 30), at(2026, 5, 5, 9, 30))
+
+    def test_weekdays_skip_weekend(self):
+        # 2026-05-08 — пятница
+        self.assertNext('0 9 * * 1-5', at(2026, 5, 8, 10, 0), at(2026, 5, 11, 9, 0))
+
+    def test_weekly_rule(self):
+        # weekly_rule принимает день в нумерации datetime.weekday(): 6 — воскресенье
+        self.assertNext(weekly_rule(6, 20, 0), at(2026, 5, 4, 12, 0), at(2026, 5, 10, 20, 0))
+
+    def test_day_of_month_or_day_of_week(self):
+        # Заданы оба поля — подходит 13-е число или любая пятница (2026-05-01 — пятница)
+        rule = '0 0 13 * 5'
+        self.assertNext(rule, at(2026, 4, 30, 12, 0), at(2026, 5, 1, 0, 0))
+        self.assertNext(rule, at(2026, 5, 8, 12, 0), at(2026, 5, 13, 0, 0))
+        self.assertNext(rule, at(2026, 5, 13, 12, 0), at(2026, 5, 15, 0, 0))
+
+    def test_day_of_month_and_star_day_of_week(self):
+        # Если одно из полей — *, учитывается только другое
+        self.assertNext('0 0 13 * *', at(2026, 5, 1, 12, 0), at(2026, 5, 13, 0, 0))
+        self.assertNext('0 0 * * 5', at(2026, 5, 9, 12, 0), at(2026, 5, 15, 0, 0))
+
+    def test_month_rollover(self):
+        self.assertNext('0 9 1 * *', at(2026, 1, 31, 10, 0), at(2026, 2, 1, 9, 0))
+        self.assertNext('0 9 * * *', at(2026, 12, 31, 23, 59), at(2027, 1, 1, 9, 0))
+
+    def test_missing_day_is_skipped(self):
+        # 31-е есть не в каждом месяце
+        self.assertNext('0 9 31 * *', at(2026, 4, 1, 0, 0), at(2026, 5, 31, 9, 0))
+        # 29 февраля — только в високосный год
+        self.assertNext('0 9 29 2 *', at(2026, 3, 1, 0, 0), at(2028, 2, 29, 9, 0))
+
+    def test_month_field(self):
+        self.assertNext('0 9 1 1,7 *', at(2026, 1, 1, 9, 0), at(2026, 7, 1, 9, 0))
+        self.assertNext('0 9 1 1,7 *', at(2026, 7, 1, 9, 0), at(2027, 1, 1, 9, 0))
+
+    def test_never_firing_rule(self):
+        with self.assertRaises(ValueError):
+            Rule('0 0 31 2 *').next_after(at(2026, 1, 1))
+
+    def test_keeps_time_zone(self):
+        moment = at(2026, 5, 4, 10, 0, tz=BERLIN)
+        result = Rule('0 9 * * *').next_after(moment)
+        self.assertIs(result.tzinfo, BERLIN)
+        self.assertEqual(result, at(2026, 5, 5, 9, 0, tz=BERLIN))
+
+    def test_dst_spring_forward_keeps_local_time(self):
+        # В ночь на 2026-03-29 часы в Берлине переводятся с 02:00 на 03:00
+        result = Rule('0 9 * * *').next_after(at(2026, 3, 28, 10, 0, tz=BERLIN))
+        self.assertEqual((result.hour, result.minute), (9, 0))
+        self.assertEqual(result.utcoffset(), timedelta(hours=2))
+        # Разность считаем по timestamp: у datetime с одной зоной вычитается местное время
+        self.assertEqual(result.timestamp() - at(2026, 3, 28, 9, 0, tz=BERLIN).timestamp(), 23 * 3600)
+
+    def test_dst_fall_back_keeps_local_time(self):
+        # В ночь на 2026-10-25 часы переводятся с 03:00 на 02:00
+        result = Rule('0 9 * * *').next_after(at(2026, 10, 24, 10, 0, tz=BERLIN))
+        self.assertEqual(result.utcoffset(), timedelta(hours=1))
+        self.assertEqual((result.hour, result.minute), (9, 0))
+        self.assertEqual(result.timestamp() - at(2026, 10, 24, 9, 0, tz=BERLIN).timestamp(), 25 * 3600)
+
+    def test_dst_skipped_local_time_still_fires(self):
+        # 02:30 29 марта в Берлине не существует — срабатывание не теряется и не уходит на сутки
+        result = Rule('30 2 * * *').next_after(at(2026, 3, 28, 12, 0, tz=BERLIN))
+        self.assertEqual(result.date(), datetime(2026, 3, 29).date())
+        self.assertGreater(result.timestamp(), at(2026, 3, 28, 12, 0, tz=BERLIN).timestamp())
+
+
+class ParseCommandTest(unittest.TestCase):
+    def test_shortcuts(self):
+        self.assertEqual(parse_command('daily 09:05 зарядка'), ('5 9 * * *', 'зарядка'))
+        self.assertEqual(parse_command('weekdays 8:00 стендап'), ('0 8 * * 1-5', 'стендап'))
+        self.assertEqual(parse_command('weekly Вс 20:00 полить цветы'), ('0 20 * * 0', 'полить цветы'))
+        self.assertEqual(parse_command('cron */30 9-18 * * 1-5 размяться'), ('*/30 9-18 * * 1-5', 'размяться'))
+
+    def test_errors(self):
+        for text in ('', 'daily', 'daily 25:00 текст', 'daily 09:00', 'weekly xx 09:00 текст',
+                     'cron 0 9 * * текст', 'hourly 09:00 текст'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parse_command(text)
+
+
+if __name__ == '__main__':
+    unittest.main()
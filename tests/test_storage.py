@@ -0,0 +1,123 @@
+"""
+Тесты хранилища SQLite (storage.py): разделение чатов между процессами, работающими с одной базой,
+и поиск по словам.
+
+Запуск из корня репозитория:
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import ReminderStore  # noqa: E402
+
+
+def at(ts):
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+class PartitionTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='alarmbot-test-')
+        path = os.path.join(self.workdir, 'reminders.db')
+        # first принимает обновления и добавляет напоминания всех чатов, как процесс polling/webhook
+        self.first = ReminderStore(path, worker_id='worker-0', worker_index=0, worker_count=2)
+        self.second = ReminderStore(path, worker_id='worker-1', worker_index=1, worker_count=2)
+        await self.first.open()
+        await self.second.open()
+        self.now = int(time.time())
+
+    async def asyncTearDown(self):
+        await self.first.close()
+        await self.second.close()
+        shutil.rmtree(self.workdir)
+
+    async def add(self, chat_id, offset, claim_until=0):
+        return await self.first.add_reminder(chat_id, at(self.now + offset), f"чат {chat_id}",
+                                             claim_until=claim_until)
+
+    async def test_each_store_claims_only_its_chats(self):
+        ids = {chat_id: await self.add(chat_id, 60) for chat_id in (10, 11, -12, -13)}
+        first = await self.first.claim_due(self.now, self.now + 120)
+        second = await self.second.claim_due(self.now, self.now + 120)
+        self.assertEqual({row[0] for row in first}, {ids[10], ids[-12]})
+        self.assertEqual({row[0] for row in second}, {ids[11], ids[-13]})
+
+    async def test_claimed_rows_are_not_taken_twice(self):
+        await self.add(11, 60)
+        self.assertEqual(len(await self.second.claim_due(self.now, self.now + 120)), 1)
+        self.assertEqual(await self.first.claim_due(self.now, self.now + 120), [])
+        # Повторный вызов владельца возвращает уже арендованную им строку
+        self.assertEqual(len(await self.second.claim_due(self.now, self.now + 120)), 1)
+
+    async def test_row_added_after_window_was_loaded(self):
+        await self.second.claim_due(self.now, self.now + 120)
+        reminder_id = await self.add(11, 60)
+        # Окно (now, now + 120] уже загружено: следующий вызов начинается с его конца
+        rows = await self.second.claim_due(self.now + 120, self.now + 180)
+        self.assertEqual([row[0] for row in rows], [reminder_id])
+
+    async def test_near_due_row_is_claimed_by_adding_store(self):
+        reminder_id = await self.add(11, 1, claim_until=self.now + 5)
+        self.assertTrue(self.first.claims(11, self.now + 1, self.now + 5))
+        self.assertFalse(self.first.claims(11, self.now + 60, self.now + 5))
+        self.assertEqual(await self.second.claim_due(self.now, self.now + 120), [])
+        self.assertTrue(await self.first.claim_for_sending(reminder_id))
+
+    async def test_add_reminders_returns_only_claimed_rows(self):
+        rows = [(at(self.now + 1), 'скоро', None), (at(self.now + 60), 'позже', None)]
+        added = await self.first.add_reminders(11, rows, self.now + 120, claim_until=self.now + 5)
+        self.assertEqual([row[2] for row in added], ['скоро'])
+        claimed = await self.second.claim_due(self.now, self.now + 120)
+        self.assertEqual([row[3] for row in claimed], ['позже'])
+
+
+class SearchTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='alarmbot-test-')
+        self.store = ReminderStore(os.path.join(self.workdir, 'reminders.db'))
+        await self.store.open()
+        now = int(time.time())
+        messages = ['Позвонить маме', 'позвонить врачу насчёт анализов', 'Купить молоко', 'позвонить маме вечером',
+                    'Поздравить маму']
+        for offset, message in enumerate(messages):
+            await self.store.add_reminder(1, at(now + offset), message)
+        await self.store.add_reminder(2, at(now), 'Позвонить маме')
+
+    async def asyncTearDown(self):
+        await self.store.close()
+        shutil.rmtree(self.workdir)
+
+    async def search(self, text, offset=0, limit=10):
+        rows, has_more = await self.store.search_reminders(1, text, offset, limit)
+        return [row[2] for row in rows], has_more
+
+    async def test_ranked_by_share_of_matching_words_then_time(self):
+        self.assertEqual(await self.search('позвонить мам'),
+                         (['Позвонить маме', 'позвонить маме вечером'], False))
+        self.assertEqual(await self.search('поз'),
+                         (['Поздравить маму', 'Позвонить маме', 'позвонить маме вечером',
+                           'позвонить врачу насчёт анализов'], False))
+
+    async def test_long_prefix_filters_rows_of_short_prefix(self):
+        # Индекс ищет по первым SEARCH_PREFIX_LENGTH символам, «Поздравить» отбрасывает search_relevance
+        self.assertEqual((await self.search('позво'))[0],
+                         ['Позвонить маме', 'позвонить маме вечером', 'позвонить врачу насчёт анализов'])
+
+    async def test_pages(self):
+        self.assertEqual(await self.search('поз', 0, 3),
+                         (['Поздравить маму', 'Позвонить маме', 'позвонить маме вечером'], True))
+        self.assertEqual(await self.search('поз', 3, 3), (['позвонить врачу насчёт анализов'], False))
+
+    async def test_no_words(self):
+        self.assertEqual(await self.store.search_reminders(1, '  ,!  '), ([], False))
+
+
+if __name__ == '__main__':
+    unittest.main()
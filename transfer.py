@@ -0,0 +1,167 @@
+import csv
+import json
+from datetime import datetime
+
+from recurrence import parse_rule
+
+# Колонки файла импорта и экспорта; rule — выражение cron для повторяющегося напоминания (необязательно)
+FIELDS = ('time', 'message', 'rule')
+
+# Длина текста напоминания с префиксом «Напоминание: » должна уложиться в сообщение Telegram (4096 символов)
+MAX_MESSAGE_LENGTH = 4000
+
+
+class ImportRowError(ValueError):
+    """
+    Ошибка в строке файла импорта; строка пропускается, остальные импортируются.
+    """
+
+    def __init__(self, line_number, reason):
+        super().__init__(f"Строка {line_number}: {reason}")
+        self.line_number = line_number
+
+
+class ImportErrors:
+    """
+    Ошибки импорта: считаются все, а для показа пользователю сохраняются только первые shown_limit,
+    чтобы файл из одних ошибочных строк не занимал память.
+    """
+
+    def __init__(self, shown_limit):
+        self.count = 0
+        self.shown = []
+        self._shown_limit = shown_limit
+
+    def add(self, error):
+        self.count += 1
+        if len(self.shown) < self._shown_limit:
+            self.shown.append(error)
+
+    def __bool__(self):
+        return self.count > 0
+
+
+def detect_format(file_name):
+    """
+    Возвращает 'csv' или 'jsonl' по расширению файла, иначе None.
+    """
+    name = (file_name or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return None
+
+
+def _records(file, file_format):
+    """
+    Читает записи файла по одной и возвращает пары (номер строки, словарь полей или None, если строку
+    JSONL не удалось разобрать).
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def _next_time(line_number, rule, moment):
+    """
+    Возвращает ближайшее срабатывание правила после moment; правило, которое никогда не срабатывает
+    (например, «0 0 31 2 *»), считается ошибкой строки.
+    """
+    try:
+        return parse_rule(rule).next_after(moment)
+    except ValueError as e:
+        raise ImportRowError(line_number, str(e)) from None
+
+
+def _parse_record(line_number, record, zone, now):
+    if record is None:
+        raise ImportRowError(line_number, "строка не является объектом JSON")
+    message = str(record.get('message') or '').strip()
+    if not message:
+        raise ImportRowError(line_number, "не указан текст напоминания")
+    if len(message) > MAX_MESSAGE_LENGTH:
+        raise ImportRowError(line_number, f"текст длиннее {MAX_MESSAGE_LENGTH} символов")
+
+    rule = str(record.get('rule') or '').strip() or None
+    if rule is not None:
+        try:
+            rule = parse_rule(rule).expression
+        except ValueError as e:
+            raise ImportRowError(line_number, str(e)) from None
+
+    time_text = str(record.get('time') or '').strip()
+    if time_text:
+        try:
+            reminder_time = datetime.fromisoformat(time_text)
+        except ValueError:
+            raise ImportRowError(line_number, f"неверное время «{time_text}», ожидается 2024-05-01 09:30") from None
+        if reminder_time.tzinfo is None:
+            reminder_time = reminder_time.replace(tzinfo=zone)
+    elif rule is not None:
+        reminder_time = _next_time(line_number, rule, now)
+    else:
+        raise ImportRowError(line_number, "не указано время")
+
+    if reminder_time <= now:
+        if rule is None:
+            raise ImportRowError(line_number, "время уже прошло")
+        reminder_time = _next_time(line_number, rule, now.astimezone(reminder_time.tzinfo))
+    elif rule is not None and time_text:
+        # Явно указанное будущее время сохраняется как есть, но правило всё равно проверяется: иначе
+        # невыполнимое правило обнаружилось бы только при первом срабатывании
+        _next_time(line_number, rule, reminder_time)
+    return reminder_time, message, rule
+
+
+def read_reminders(file, file_format, zone, now, errors):
+    """
+    Построчно читает файл импорта и возвращает напоминания (время с часовым поясом, текст, правило или None).
+
+    Время без часового пояса считается временем zone. Для повторяющегося напоминания время можно не указывать
+    или указать прошедшее — берётся ближайшее срабатывание правила. Строки с ошибками пропускаются,
+    а сами ошибки добавляются в errors (ImportErrors).
+    """
+    try:
+        for line_number, record in _records(file, file_format):
+            try:
+                yield _parse_record(line_number, record, zone, now)
+            except ImportRowError as e:
+                errors.add(e)
+    except (csv.Error, UnicodeDecodeError) as e:
+        # Файл дальше не читается: ошибка разбора CSV или неверная кодировка
+        errors.add(e)
+
+
+class ReminderWriter:
+    """
+    Записывает строки экспорта (reminder_ts, reminder_message, is_sent, правило) в CSV или JSONL.
+    Время записывается в часовом поясе чата, так что файл можно загрузить обратно через /import.
+    """
+
+    def __init__(self, file, file_format, zone):
+        self._file = file
+        self._format = file_format
+        self._zone = zone
+        if file_format == 'csv':
+            self._csv = csv.writer(file)
+            self._csv.writerow((*FIELDS, 'sent'))
+
+    def write(self, row):
+        reminder_ts, message, is_sent, rule = row
+        reminder_time = datetime.fromtimestamp(reminder_ts, self._zone).isoformat(timespec='minutes')
+        if self._format == 'csv':
+            self._csv.writerow((reminder_time, message, rule or '', is_sent))
+        else:
+            record = {'time': reminder_time, 'message': message, 'rule': rule, 'sent': bool(is_sent)}
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')